@@ -1,12 +1,32 @@
 """ This module provides audio processing utilities:
+- AudioClip: samples, rate and layout in NumPy; the functions below take it wherever they take an AudioFrame
 - wav2af: convert a wav file to an AudioFrame
+- wav2clip: convert a wav file to an AudioClip
+- decode: lazily decode audio in any container (wav, m4a, flac, opus...) to AudioFrames
+- decode_ndarray: decode audio in any container to an int16 array
 - energy: calculate the RMS energy of an audio frame
+- energy_profile: calculate the RMS energy of each window of an audio frame
+- is_silent: check whether an audio frame contains any sound
+- trim_silence: drop leading and trailing silence from an audio frame
 - seconds: calculate the length in seconds of an audio frame
+- content_hash: identify audio by its samples rather than its encoding
+- split: cut an audio frame into fixed-duration frames, e.g. 20ms for playout
+- concat: join consecutive audio frames into one
+- resample: change the sample rate of audio with a polyphase FIR filter
+- AudioConverter: convert a stream of audio frames to one format, layout and rate
+- af2wav: convert an AudioFrame to a wav file
+- encode: compress AudioFrames with a PyAV codec, e.g. flac
+- af2flac: convert an AudioFrame to flac
+- AudioRingBuffer: keep the last few seconds of a live audio stream
 """
+from fractions import Fraction
+import functools
+import hashlib
 import io
+import math
 import os
 from pathlib import Path
-from textwrap import shorten
+from typing import Iterator
 
 import av
 from google.cloud.storage import Client
@@ -15,71 +35,651 @@ import numpy as np
 
 from . import wavfile
 
-def energy(af: av.AudioFrame) -> float:
+SILENCE_DBFS = -45.0  # windows quieter than this are treated as silence
+
+class AudioClip:
+    """Audio as a NumPy array of shape (samples, channels), with its sample rate and channel layout.
+    Cheaper to make and slice than an av.AudioFrame, and it duck-types as one (.samples, .rate, .layout.name) for
+    the numeric functions in this module; convert with to_af() only where PyAV is needed, e.g. for transport.
+    """
+    __slots__ = ("data", "rate", "_layout")
+
+    def __init__(self, data: np.ndarray, rate: int, layout: str | None = None):
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+        if data.dtype not in _AV_FORMATS:
+            raise ValueError(f"Unsupported sample dtype: {data.dtype}; use one of {list(_AV_FORMATS)}")
+        if layout is None:
+            layout = "stereo" if data.shape[1] == 2 else "mono"
+        self._layout = av.AudioLayout(layout)
+        if len(self._layout.channels) != data.shape[1]:
+            raise ValueError(f"{data.shape[1]} channels don't match the {layout} layout")
+        self.data = data
+        self.rate = rate
+
+    def __repr__(self) -> str:
+        return f"<AudioClip {self.data.dtype} {self.layout.name}, {self.samples} samples at {self.rate}Hz>"
+
+    @property
+    def samples(self) -> int:
+        return len(self.data)
+
+    @property
+    def layout(self) -> av.AudioLayout:
+        return self._layout
+
+    @classmethod
+    def from_af(cls, af: av.AudioFrame) -> "AudioClip":
+        """Wrap the samples of an audio frame. Packed frames (e.g. s16) are viewed in place; planar frames are copied."""
+        data = _plane_arrays(af)[0] if af.format.is_packed else _af_ndarray(af)
+        return cls(data, af.rate, af.layout.name)
+
+    def to_af(self) -> av.AudioFrame:
+        """Copy the samples into a new packed audio frame. PyAV frames own their buffers, so this is the one copy."""
+        af = av.AudioFrame(format=_AV_FORMATS[self.data.dtype], layout=self.layout.name, samples=self.samples)
+        _plane_arrays(af)[0][:] = self.data
+        af.rate = self.rate
+        return af
+
+def _af_ndarray(af: av.AudioFrame | AudioClip) -> np.ndarray:
+    """The samples of an audio frame as an array of shape (samples, channels)."""
+    if isinstance(af, AudioClip):
+        return af.data
+    arr = af.to_ndarray()
+    if af.format.is_planar:
+        return arr.T
+    return arr.reshape(-1, len(af.layout.channels))
+
+def _ndarray2af(arr: np.ndarray, like: av.AudioFrame | AudioClip) -> av.AudioFrame | AudioClip:
+    """Make an audio frame (or clip) from an array of shape (samples, channels), with the format, layout and rate of another."""
+    if isinstance(like, AudioClip):
+        return AudioClip(arr, like.rate, like.layout.name)
+    if like.format.is_planar:
+        arr = arr.T
+    else:
+        arr = arr.reshape(1, -1)
+    af = av.AudioFrame.from_ndarray(np.ascontiguousarray(arr), format=like.format.name, layout=like.layout.name)
+    af.rate = like.rate
+    return af
+
+def energy(af: av.AudioFrame | AudioClip) -> float:
     """Calculate the RMS energy of an audio frame."""
-    arr = af.to_ndarray()  # produces array with dtype of int16
-    # NOTE int16 is too small for squares of typical signal stregth so int32 is used
-    energy = np.sqrt(np.mean(np.square(arr, dtype=np.int32)))
+    arr = _af_ndarray(af)  # produces array with dtype of int16
+    # NOTE int16 is too small for squares of typical signal stregth; einsum accumulates in float64 without a full-size temporary
+    energy = np.sqrt(np.einsum('ij,ij->', arr, arr, dtype=np.float64) / arr.size)
     logger.trace(f"frame energy: {energy:.3f}")
     assert not np.isnan(energy)
     return energy
 
+def _full_scale(dtype: np.dtype) -> float:
+    """The amplitude of a full-scale sample: 1.0 for floats, 2**(bits - 1) for integers."""
+    dtype = np.dtype(dtype)
+    if dtype.kind == 'f':
+        return 1.0
+    return float(2 ** (8 * dtype.itemsize - 1))
+
+def _window_bounds(samples: int, window: int, hop: int, tail: bool) -> tuple[np.ndarray, np.ndarray]:
+    """The start and stop samples of each complete window, and with tail, of a last window ending at the last sample."""
+    n_windows = (samples - window) // hop + 1 if samples >= window else 0
+    starts = np.arange(n_windows) * hop
+    stops = starts + window
+    if tail and samples > 0 and (n_windows == 0 or stops[-1] < samples):
+        starts = np.append(starts, max(samples - window, 0))
+        stops = np.append(stops, samples)
+    return starts, stops
+
+def energy_profile(af: av.AudioFrame | AudioClip, window_ms: float = 20, hop_ms: float = 10, dbfs: bool = False, tail: bool = False) -> np.ndarray:
+    """Calculate the RMS energy of each window of an audio frame.
+    Args:
+        af: the audio frame.
+        window_ms: length of each window in milliseconds.
+        hop_ms: distance between the starts of consecutive windows in milliseconds.
+        dbfs: if True, return decibels relative to the full scale of the sample format instead of raw RMS; silent windows are -inf.
+        tail: if True, add a last window ending at the last sample when the complete windows stop short of it;
+            for a frame shorter than one window, that is the whole frame.
+    Returns:
+        1-D float64 array with one value per window; without tail, empty if the frame is shorter than one window.
+    """
+    arr = _af_ndarray(af)
+    full_scale = _full_scale(arr.dtype)
+    if arr.dtype.kind == 'u':
+        arr = arr.astype(np.int16) - 128  # NOTE u8 samples are centred on 128
+    samples, channels = arr.shape
+    window = max(round(af.rate * window_ms / 1000), 1)
+    hop = max(round(af.rate * hop_ms / 1000), 1)
+    starts, stops = _window_bounds(samples, window, hop, tail)
+    # NOTE windowed sums of squares as differences of one cumulative sum, so there is no per-window loop;
+    # the per-sample power is written into the cumulative sum's buffer and summed in place, so it's the only temporary
+    csum = np.empty(samples + 1, dtype=np.float64)
+    csum[0] = 0.0
+    np.einsum('ij,ij->i', arr, arr, dtype=np.float64, out=csum[1:])
+    np.cumsum(csum[1:], out=csum[1:])
+    power = np.maximum(csum[stops] - csum[starts], 0.0) / ((stops - starts) * channels)
+    rms = np.sqrt(power)
+    if dbfs:
+        with np.errstate(divide='ignore'):
+            return 20 * np.log10(rms / full_scale)
+    return rms
+
+
+def is_silent(af: av.AudioFrame | AudioClip, threshold_dbfs: float = SILENCE_DBFS, window_ms: float = 20) -> bool:
+    """Check whether no window of an audio frame is louder than the threshold.
+    The last window may be partial, so sound in the final few milliseconds, or in a frame shorter than one window, counts.
+    """
+    profile = energy_profile(af, window_ms=window_ms, hop_ms=window_ms, dbfs=True, tail=True)
+    if len(profile) == 0:
+        return True
+    loudest = profile.max()
+    logger.trace(f"loudest window: {loudest:.1f} dBFS")
+    return loudest < threshold_dbfs
 
-def seconds(af: av.AudioFrame) -> float:
+def trim_silence(af: av.AudioFrame | AudioClip, threshold_dbfs: float = SILENCE_DBFS, window_ms: float = 20, pad_ms: float = 100) -> av.AudioFrame | AudioClip:
+    """Drop the leading and trailing silence of an audio frame.
+    Args:
+        af: the audio frame.
+        threshold_dbfs: windows quieter than this are silence.
+        window_ms: resolution of the silence detection in milliseconds.
+        pad_ms: silence to keep either side of the sound, so word onsets and tails aren't clipped.
+    Returns:
+        A new audio frame with the same format, layout and rate; a clip is trimmed to a view of its samples.
+        A frame shorter than one window is returned unchanged.
+    Raises:
+        - ValueError if the whole frame is silent, exactly when is_silent is True; check with is_silent first.
+    """
+    profile = energy_profile(af, window_ms=window_ms, hop_ms=window_ms, dbfs=True, tail=True)
+    loud = np.flatnonzero(profile >= threshold_dbfs)
+    if len(loud) == 0:
+        raise ValueError("Audio frame is silent.")
+    window = max(round(af.rate * window_ms / 1000), 1)
+    if af.samples < window:
+        return af
+    starts, stops = _window_bounds(af.samples, window, window, tail=True)
+    pad = round(af.rate * pad_ms / 1000)
+    start = max(starts[loud[0]] - pad, 0)
+    stop = min(stops[loud[-1]] + pad, af.samples)
+    logger.debug(f"Trimming silence: keeping samples {start}:{stop} of {af.samples}")
+    return _ndarray2af(_af_ndarray(af)[start:stop], af)
+
+def seconds(af: av.AudioFrame | AudioClip) -> float:
     """Calculate the length in seconds of an audio frame."""
     seconds = af.samples / af.rate
     return seconds
 
+def _plane_arrays(af: av.AudioFrame) -> list[np.ndarray]:
+    """Writable views of the samples in each plane of an audio frame, of shape (samples, values per sample)."""
+    dtype = _WAV_DTYPES[af.format.packed.name]
+    width = 1 if af.format.is_planar else len(af.layout.channels)
+    # NOTE the planes may be padded for alignment, so only view the samples
+    return [np.frombuffer(plane, dtype=dtype, count=af.samples * width).reshape(af.samples, width) for plane in af.planes]
+
+def _hash_blocks(rate: int, channels: int, blocks: Iterator[np.ndarray]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    dtype = ''
+    for block in blocks:
+        # NOTE hash little-endian samples, so RIFX and RIFF files of the same audio match
+        block = block.astype(block.dtype.newbyteorder('<'), copy=False)
+        dtype = block.dtype.str
+        digest.update(np.ascontiguousarray(block))
+    digest.update(f"{rate}:{channels}:{dtype}".encode())
+    return digest.hexdigest()
 
-def _wavb2af(wav: io.BytesIO) -> av.AudioFrame:
-    sample_rate, arr = wavfile.read(wav)
+def content_hash(aud: av.AudioFrame | AudioClip | bytes | io.BytesIO | Path, block_frames: int = 4096) -> str:
+    """Hash the decoded samples, sample rate and channel count of audio, e.g. as a cache key.
+    Wavs that differ only in their header chunks hash the same, and so does a 16-bit wav and its wav2af frame.
+    Wavs are hashed one block at a time, in place for bytes and BytesIO, so the whole file is never decoded at once.
+    Returns:
+        A 32 character hex digest.
+    """
+    if isinstance(aud, (av.AudioFrame, AudioClip)):
+        arr = _af_ndarray(aud)
+        return _hash_blocks(aud.rate, arr.shape[1], [arr])
+    if isinstance(aud, io.BytesIO):
+        aud = aud.getbuffer()
+    elif not isinstance(aud, (bytes, Path)):
+        raise TypeError(f"aud must be an AudioFrame, AudioClip, bytes, io.BytesIO, or Path, not {type(aud)}")
+    channels = wavfile.info(aud).channels
+    rate, blocks = wavfile.iter_blocks(aud, block_frames=block_frames)
+    return _hash_blocks(rate, channels, blocks)
+
+def split(af: av.AudioFrame | AudioClip, frame_ms: float = 20, pad: bool = False) -> list[av.AudioFrame] | list[AudioClip]:
+    """Cut an audio frame into consecutive frames of frame_ms each, e.g. for a transport that plays out 20ms frames.
+    Each chunk is copied once, from a view of the original frame's planes straight into the new frame's buffer.
+    A clip is cut into clips that are views of its samples, except for a padded last clip.
+    Args:
+        af: the audio frame, in any sample format.
+        frame_ms: the duration of each frame.
+        pad: if True, pad the last frame with silence to the full duration; otherwise it may be shorter.
+    Returns:
+        The frames, with pts counted in samples from the original frame's pts (or 0), and time_base 1/rate;
+        a pts without a time_base is read as a count of samples.
+    """
+    size = round(af.rate * frame_ms / 1000)
+    if size < 1:
+        raise ValueError(f"{frame_ms}ms is less than one sample at {af.rate}Hz")
+    if isinstance(af, AudioClip):
+        clips = [AudioClip(af.data[start:start + size], af.rate, af.layout.name) for start in range(0, af.samples, size)]
+        if pad and clips and clips[-1].samples < size:
+            last = clips[-1].data
+            silence = np.full((size - len(last), last.shape[1]), 128 if last.dtype == np.uint8 else 0, dtype=last.dtype)
+            clips[-1] = AudioClip(np.concatenate([last, silence]), af.rate, af.layout.name)
+        return clips
+    src = _plane_arrays(af)
+    # NOTE a pts without a time_base, e.g. set on a wav2af frame, is taken to be in samples already
+    start_pts = 0 if af.pts is None else int(af.pts * (af.time_base or Fraction(1, af.rate)) * af.rate)
+    time_base = Fraction(1, af.rate)
+    silence = 128 if af.format.packed.name == 'u8' else 0
+    frames = []
+    for start in range(0, af.samples, size):
+        n = min(size, af.samples - start)
+        chunk = av.AudioFrame(format=af.format.name, layout=af.layout.name, samples=size if pad else n)
+        for dst, plane in zip(_plane_arrays(chunk), src):
+            dst[:n] = plane[start:start + n]
+            dst[n:] = silence
+        chunk.rate = af.rate
+        chunk.time_base = time_base
+        chunk.pts = start_pts + start
+        frames.append(chunk)
+    return frames
+
+def concat(frames: list[av.AudioFrame] | list[AudioClip]) -> av.AudioFrame | AudioClip:
+    """Join consecutive audio frames of the same format, layout and rate into one frame, with the first frame's pts.
+    Clips are joined into one clip.
+    """
+    if not frames:
+        raise ValueError("No frames to concatenate")
+    first = frames[0]
+    if isinstance(first, AudioClip):
+        key = (first.data.dtype, first.layout.name, first.rate)
+        for clip in frames:
+            if (clip.data.dtype, clip.layout.name, clip.rate) != key:
+                raise ValueError(f"Can't concatenate {(clip.data.dtype, clip.layout.name, clip.rate)} audio to {key}")
+        return AudioClip(np.concatenate([clip.data for clip in frames]), first.rate, first.layout.name)
+    key = (first.format.name, first.layout.name, first.rate)
+    af = av.AudioFrame(format=first.format.name, layout=first.layout.name, samples=sum(f.samples for f in frames))
+    dst = _plane_arrays(af)
+    offset = 0
+    for frame in frames:
+        if (frame.format.name, frame.layout.name, frame.rate) != key:
+            raise ValueError(f"Can't concatenate {(frame.format.name, frame.layout.name, frame.rate)} audio to {key}")
+        for plane, src in zip(dst, _plane_arrays(frame)):
+            plane[offset:offset + frame.samples] = src
+        offset += frame.samples
+    af.rate = first.rate
+    if first.time_base is not None:
+        af.time_base = first.time_base
+    af.pts = first.pts
+    return af
+
+def _to_s16(arr: np.ndarray, out: np.ndarray):
+    """Convert samples as returned by wavfile.read to int16, writing straight into out."""
+    if arr.dtype.kind == 'i' and arr.dtype.itemsize > 2:
+        # NOTE wider integer PCM is left-justified, so the top 16 bits are the s16 sample
+        np.right_shift(arr, 8 * (arr.dtype.itemsize - 2), out=out, casting='unsafe')
+    elif arr.dtype.kind == 'u':
+        np.subtract(arr, 128, out=out, dtype=np.int16, casting='unsafe')
+        np.left_shift(out, 8, out=out)
+    elif arr.dtype.kind == 'f':
+        np.multiply(np.clip(arr, -1.0, 1.0), 32767, out=out, casting='unsafe')
+    else:
+        np.copyto(out, arr, casting='unsafe')
+
+def _arr2af(sample_rate: int, arr: np.ndarray) -> av.AudioFrame:
+    """Copy decoded wav samples into a new s16 AudioFrame's plane buffer; this is the only copy."""
     if len(arr.shape) == 1:
         arr = arr.reshape(-1, 1)
     samples, channels = arr.shape
     layout = "stereo" if channels == 2 else "mono"
     assert channels == len(av.AudioLayout(layout).channels)
-    format = av.AudioFormat("s16")
-    with logger.contextualize(sample_rate=sample_rate, samples=samples, channels=channels, layout=layout, planar=format.is_planar):
-        try:
-            af = av.AudioFrame.from_ndarray(arr.ravel().reshape(1, -1), format='s16', layout=layout)
-        except:
-            logger.error(f"Failed to create AudioFrame from wav bytes (as hex): {shorten(wav.hex(), 100)}")
+    with logger.contextualize(sample_rate=sample_rate, samples=samples, channels=channels, layout=layout, dtype=str(arr.dtype)):
+        af = av.AudioFrame(format='s16', layout=layout, samples=samples)
+        # NOTE the plane may be padded for alignment, so only view the samples
+        plane = np.frombuffer(af.planes[0], dtype=np.int16, count=samples * channels).reshape(samples, channels)
+        _to_s16(arr, plane)
     af.rate = sample_rate
     logger.debug(f"af={af}")
     return af
 
-def _wavp2af(waf: Path) -> av.AudioFrame:
-    with open(waf, "rb") as f:
-        wavb = f.read()
-    return _wavb2af(wavb)
+def _wavb2ndarray(wav: bytes | io.BytesIO) -> tuple[int, np.ndarray]:
+    if isinstance(wav, io.BytesIO):
+        wav = wav.getbuffer()  # NOTE decode in place rather than via wav.read()
+    return wavfile.read(wav)
+
+def _wavp2ndarray(waf: Path) -> tuple[int, np.ndarray]:
+    try:
+        return wavfile.read(waf, mmap=True)
+    except ValueError:
+        logger.debug("Can't memory-map this wav's samples, reading them instead.")
+        return wavfile.read(waf)
 
-def wav2af(wav: bytes | io.BytesIO | Path):
-    """Convert a wav file to an AudioFrame."""
+def _wav2ndarray(wav: bytes | io.BytesIO | Path) -> tuple[int, np.ndarray]:
     if isinstance(wav, bytes):
-        return _wavb2af(io.BytesIO(wav))
+        return _wavb2ndarray(wav)
     elif isinstance(wav, io.BytesIO):
-        return _wavb2af(wav)
+        return _wavb2ndarray(wav)
     elif isinstance(wav, Path):
-        return _wavp2af(wav)
+        return _wavp2ndarray(wav)
     else:
         raise TypeError(f"wav must be bytes, io.BytesIO, or Path, not {type(wav)}")
 
-def af2wav(af: av.AudioFrame) -> io.BytesIO:
-    """Convert an AudioFrame to a wav file."""
-    assert isinstance(af, av.AudioFrame)
-    af.pts = None
-    af.time_base = None
-    af.layout = "stereo"
-    af.format = "s16"
-    af.rate = 24000
-    af.samples = 24000
-    af.planes = 1
-    af.linesize = 1
-    af = af.reformat(format="s16", layout="stereo", rate=24000)
-    af = af.to_ndarray()
-    wav = wavfile.write(af)
+def wav2af(wav: bytes | io.BytesIO | Path) -> av.AudioFrame:
+    """Convert a wav file to an AudioFrame.
+    The samples are decoded straight into the frame's buffer: bytes and BytesIO are read in place and files are memory-mapped.
+    """
+    return _arr2af(*_wav2ndarray(wav))
+
+def wav2clip(wav: bytes | io.BytesIO | Path) -> AudioClip:
+    """Convert a wav file to a read-only 16-bit AudioClip.
+    16-bit samples aren't copied at all: the clip is a view of the bytes, or of a copy-on-write memory map of the file.
+    A BytesIO is read through getvalue(), so the clip neither pins the caller's buffer nor sees later writes to it.
+    """
+    if isinstance(wav, io.BytesIO):
+        wav = wav.getvalue()  # NOTE shares the buffer until either side is written, rather than exporting it
+    rate, arr = _wav2ndarray(wav)
+    if arr.dtype != np.int16:
+        out = np.empty(arr.shape, dtype=np.int16)
+        _to_s16(arr, out)
+        arr = out
+    arr.flags.writeable = False
+    return AudioClip(arr, rate)
+
+def decode(src: bytes | io.BytesIO | Path | str, format: str | None = None, layout: str | None = None, rate: int | None = None) -> Iterator[av.AudioFrame]:
+    """Decode audio in any container PyAV understands, e.g. the m4a that iOS uploads, one frame at a time.
+    Nothing is read until the first frame is requested, and bytes are demuxed in memory rather than from a temp file.
+    Args:
+        src: the encoded audio; bytes, a file-like object or a path.
+        format, layout, rate: if any is given, convert the frames to it; the others default to the stream's own.
+    Yields:
+        The decoded frames of the first audio stream.
+    """
+    if isinstance(src, bytes):
+        src = io.BytesIO(src)
+    elif isinstance(src, Path):
+        src = str(src)
+    with av.open(src) as container:
+        stream = container.streams.audio[0]
+        logger.debug(f"Decoding {stream.codec_context.name} audio from {container.format.name}")
+        frames = container.decode(stream)
+        if format is None and layout is None and rate is None:
+            yield from frames
+            return
+        converter = AudioConverter(
+            format=format or stream.format.name,
+            layout=layout or stream.layout.name,
+            rate=rate or stream.rate,
+        )
+        for af in frames:
+            yield from converter.convert(af)
+        yield from converter.flush()
+
+def decode_ndarray(src: bytes | io.BytesIO | Path | str) -> tuple[int, np.ndarray]:
+    """Decode audio in any container to 16-bit samples.
+    Returns:
+        The sample rate, and an int16 array of shape (samples, channels).
+    """
+    rate, blocks = None, []
+    for af in decode(src, format="s16"):
+        rate = af.rate
+        blocks.append(_af_ndarray(af))
+    if not blocks:
+        raise ValueError("No audio frames decoded")
+    return rate, np.concatenate(blocks)
+
+RESAMPLE_ZERO_CROSSINGS = 16  # sinc zero crossings either side of each output sample; more is sharper and slower
+RESAMPLE_ROLLOFF = 0.95  # lowpass cutoff as a fraction of the lower Nyquist frequency
+RESAMPLE_KAISER_BETA = 8.6
+
+@functools.lru_cache(maxsize=16)
+def _filter_bank(up: int, down: int) -> tuple[np.ndarray, int]:
+    """Polyphase windowed-sinc filter bank for resampling by up/down.
+    Returns:
+        - bank: float32 array of shape (up, 2 * half); row p holds the taps for output samples that fall p/up of the way between two input samples.
+        - half: taps either side of the output sample, in input samples.
+    """
+    fc = 0.5 * min(1.0, up / down) * RESAMPLE_ROLLOFF  # cutoff in cycles per input sample
+    half = math.ceil(RESAMPLE_ZERO_CROSSINGS / (2 * fc))
+    # NOTE tau is the distance from each tap's input sample to the output sample
+    tau = np.arange(up)[:, None] / up + (half - 1 - np.arange(2 * half))[None, :]
+    window = np.i0(RESAMPLE_KAISER_BETA * np.sqrt(np.clip(1 - (tau / half) ** 2, 0, None))) / np.i0(RESAMPLE_KAISER_BETA)
+    bank = 2 * fc * np.sinc(2 * fc * tau) * window
+    bank /= bank.sum(axis=1, keepdims=True)  # unit DC gain for every phase
+    logger.debug(f"Built resampling filter bank: up={up} down={down} taps={2 * half}")
+    return bank.astype(np.float32), half
+
+def _resample_ndarray(arr: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    g = math.gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+    if up == down or len(arr) == 0:
+        return arr
+    bank, half = _filter_bank(up, down)
+    x = arr.reshape(len(arr), -1)
+    n_in, channels = x.shape
+    n_out = -(-n_in * up // down)
+    xpad = np.zeros((n_in + 2 * half, channels), dtype=np.float32)
+    xpad[half:half + n_in] = x
+    # NOTE windows[s] is xpad[s:s + 2 * half], a strided view rather than a copy
+    windows = np.lib.stride_tricks.sliding_window_view(xpad, 2 * half, axis=0)
+    out = np.empty((n_out, channels), dtype=np.float32)
+    # NOTE output samples n = q * up + r share a filter phase and step through the input by `down`
+    for r in range(min(up, n_out)):
+        phase = r * down % up
+        start = r * down // up + 1
+        count = len(range(r, n_out, up))
+        taps = windows[start:start + (count - 1) * down + 1:down]
+        np.einsum('qck,k->qc', taps, bank[phase], out=out[r::up])
+    if arr.dtype.kind in 'iu':
+        info = np.iinfo(arr.dtype)
+        out = np.clip(np.rint(out), info.min, info.max)
+    out = out.astype(arr.dtype, copy=False)
+    return out.reshape(-1) if arr.ndim == 1 else out
+
+def resample(arr: np.ndarray | av.AudioFrame | AudioClip, src_rate: int | None, dst_rate: int) -> np.ndarray | av.AudioFrame | AudioClip:
+    """Change the sample rate of audio with a vectorized polyphase FIR resampler.
+    Filter banks are cached per rate pair, so repeated conversions (e.g. 48kHz WebRTC to 16kHz for Speech-to-Text) only design the filter once.
+    Args:
+        arr: int16 or float32 samples of shape (samples,) or (samples, channels); or an s16 AudioFrame or AudioClip.
+        src_rate: sample rate of arr; may be None for an AudioFrame or AudioClip, which carries its own rate.
+        dst_rate: the sample rate to convert to.
+    Returns:
+        The resampled audio, of the same type, dtype, layout and number of channels.
+    """
+    if isinstance(arr, (av.AudioFrame, AudioClip)):
+        af = arr
+        src_rate = src_rate or af.rate
+        result = _ndarray2af(_resample_ndarray(_af_ndarray(af), src_rate, dst_rate), af)
+        result.rate = dst_rate
+        return result
+    if src_rate is None:
+        raise ValueError("src_rate is required for ndarray audio")
+    return _resample_ndarray(arr, src_rate, dst_rate)
+
+# NOTE numpy dtypes that wavfile writes for each packed AudioFormat
+_WAV_DTYPES = {'u8': np.uint8, 's16': np.int16, 's32': np.int32, 'flt': np.float32, 'dbl': np.float64}
+_AV_FORMATS = {np.dtype(dtype): format for format, dtype in _WAV_DTYPES.items()}
+
+class AudioConverter:
+    """Convert a stream of audio frames to one format, layout and rate.
+    An av.AudioResampler is built once per input (format, layout, rate) and reused for every frame of the stream;
+    frames that already match the target skip resampling entirely. Not thread-safe: use one converter per stream.
+    """
+    def __init__(self, format: str = "s16", layout: str = "stereo", rate: int = 24000):
+        self.format = av.AudioFormat(format).name
+        self.layout = av.AudioLayout(layout).name
+        self.rate = rate
+        self._resamplers: dict[tuple[str, str, int], av.AudioResampler] = {}
+
+    def convert(self, af: av.AudioFrame) -> list[av.AudioFrame]:
+        """Convert a frame. The resampler may buffer a few samples; call flush() at the end of the stream."""
+        if (af.format.name, af.layout.name, af.rate) == (self.format, self.layout, self.rate):
+            return [af]
+        key = (af.format.name, af.layout.name, af.rate)
+        resampler = self._resamplers.get(key)
+        if resampler is None:
+            logger.debug(f"Creating resampler: {key} -> {(self.format, self.layout, self.rate)}")
+            resampler = self._resamplers[key] = av.AudioResampler(format=self.format, layout=self.layout, rate=self.rate)
+        return resampler.resample(af)
+
+    def flush(self) -> list[av.AudioFrame]:
+        """Drain the samples buffered in the resamplers. A flushed resampler can't be reused, so they are dropped."""
+        frames = []
+        for resampler in self._resamplers.values():
+            frames.extend(resampler.resample(None))
+        self._resamplers.clear()
+        return frames
+
+def _s16_ndarray(af: av.AudioFrame | AudioClip, channels: int, rate: int) -> np.ndarray:
+    """Convert a mono or stereo frame to 16-bit mono or stereo samples at a rate, in NumPy.
+    Channels are averaged or duplicated, and the rate is only converted, with resample's cached filters, when it changes.
+    """
+    arr = _af_ndarray(af)
+    if arr.dtype != np.int16:
+        out = np.empty(arr.shape, dtype=np.int16)
+        _to_s16(arr, out)
+        arr = out
+    if channels < arr.shape[1]:
+        # NOTE downmix before resampling, so there's less to resample
+        arr = (arr.sum(axis=1, dtype=np.int32, keepdims=True) // arr.shape[1]).astype(np.int16)
+    if af.rate != rate:
+        arr = _resample_ndarray(arr, af.rate, rate)
+    if channels > arr.shape[1]:
+        arr = np.repeat(arr, channels, axis=1)
+    return arr
+
+def af2wav(af: av.AudioFrame | AudioClip, format: str = "s16", layout: str = "stereo", rate: int = 24000) -> io.BytesIO:
+    """Convert an AudioFrame to a wav file.
+    16-bit mono or stereo output from mono or stereo frames is converted in NumPy, without building an av.AudioResampler;
+    other conversions go through an AudioConverter.
+    Args:
+        af: the audio frame.
+        format, layout, rate: the target sample format, channel layout and sample rate; defaults to 16-bit stereo at 24kHz.
+    Returns:
+        The wav file, positioned at its start.
+    """
+    assert isinstance(af, (av.AudioFrame, AudioClip))
+    fmt = av.AudioFormat(format)
+    if fmt.packed.name not in _WAV_DTYPES:
+        raise ValueError(f"Can't write {format} audio to wav; use one of {list(_WAV_DTYPES)}")
+    wav = io.BytesIO()
+    channels = len(av.AudioLayout(layout).channels)
+    if fmt.packed.name == 's16' and {af.layout.name, layout} <= {"mono", "stereo"}:
+        wavfile.write(wav, rate, _s16_ndarray(af, channels, rate))
+        wav.seek(0)
+        return wav
+    if isinstance(af, AudioClip):
+        af = af.to_af()
+    converter = AudioConverter(format=format, layout=layout, rate=rate)
+    with wavfile.WavWriter(wav, rate, channels=channels, dtype=_WAV_DTYPES[fmt.packed.name]) as writer:
+        for frame in converter.convert(af):
+            writer.append(frame)
+        for frame in converter.flush():
+            writer.append(frame)
     return wav
 
+# NOTE container to mux each codec's packets into
+_CONTAINERS = {"flac": "flac", "libopus": "ogg", "opus": "ogg", "aac": "adts", "mp3": "mp3", "pcm_s16le": "wav"}
+
+def encode(af: av.AudioFrame | AudioClip | list[av.AudioFrame | AudioClip], codec: str = "flac") -> bytes:
+    """Encode audio frames in memory with PyAV.
+    Args:
+        af: the audio frame or clip, or consecutive frames of one stream.
+        codec: the ffmpeg encoder; "flac" is lossless and about half the size of wav, and Speech-to-Text reads its header.
+    Returns:
+        The encoded audio in the codec's usual container, e.g. a .flac file.
+    """
+    frames = [af] if isinstance(af, (av.AudioFrame, AudioClip)) else af
+    frames = [frame.to_af() if isinstance(frame, AudioClip) else frame for frame in frames]
+    try:
+        container_format = _CONTAINERS[codec]
+    except KeyError as exc:
+        raise ValueError(f"Unsupported codec: {codec}; use one of {list(_CONTAINERS)}") from exc
+    buf = io.BytesIO()
+    with av.open(buf, "w", format=container_format) as container:
+        stream = container.add_stream(codec, rate=frames[0].rate)
+        stream.layout = frames[0].layout.name
+        for frame in frames:
+            for packet in stream.encode(frame):
+                container.mux(packet)
+        for packet in stream.encode(None):
+            container.mux(packet)
+    logger.debug(f"Encoded {sum(f.samples for f in frames)} samples to {buf.tell()} bytes of {codec}")
+    return buf.getvalue()
+
+def af2flac(af: av.AudioFrame | AudioClip) -> bytes:
+    """Convert an AudioFrame to flac."""
+    return encode(af, codec="flac")
+
+class AudioRingBuffer:
+    """Keep the last few seconds of a live audio stream as 16-bit samples, in fixed memory.
+    The buffer is allocated twice over and every sample is written to both halves, so any window of up to
+    `capacity` samples is contiguous and latest() can return a view instead of concatenating blocks.
+    Lock-free, but not thread-safe: append from one thread, and copy views you keep past the next append.
+    """
+    __slots__ = ("rate", "channels", "capacity", "_buf", "_pos", "_filled")
+
+    def __init__(self, seconds: float, rate: int = 24000, channels: int = 2):
+        self.rate = rate
+        self.channels = channels
+        self.capacity = int(seconds * rate)
+        if self.capacity < 1:
+            raise ValueError(f"Ring buffer must hold at least one sample, not {seconds} seconds at {rate}Hz")
+        self._buf = np.zeros((2 * self.capacity, channels), dtype=np.int16)
+        self._pos = 0  # where the next sample goes, in [0, capacity)
+        self._filled = 0
+
+    def __len__(self) -> int:
+        return self._filled
+
+    @property
+    def seconds(self) -> float:
+        """The length in seconds of the buffered audio."""
+        return self._filled / self.rate
+
+    def clear(self):
+        self._pos = self._filled = 0
+
+    def append(self, af: av.AudioFrame | AudioClip | np.ndarray):
+        """Append an audio frame or clip, or an array of shape (samples, channels), overwriting the oldest samples once full.
+        Only the appended samples are touched: each is converted to int16 straight into the buffer.
+        """
+        if isinstance(af, (av.AudioFrame, AudioClip)):
+            if af.rate != self.rate:
+                raise ValueError(f"Frame rate {af.rate} doesn't match the buffer's {self.rate}")
+            arr = _af_ndarray(af)
+        else:
+            arr = af.reshape(-1, 1) if af.ndim == 1 else af
+        if arr.shape[1] != self.channels:
+            raise ValueError(f"Expected {self.channels} channels, got {arr.shape[1]}")
+        cap = self.capacity
+        arr = arr[-cap:]  # NOTE older samples would be overwritten anyway
+        n = len(arr)
+        head = min(n, cap - self._pos)
+        for start in (self._pos, self._pos + cap):
+            _to_s16(arr[:head], self._buf[start:start + head])
+        if head < n:
+            # NOTE wrapped: the rest goes to the start of both halves
+            for start in (0, cap):
+                _to_s16(arr[head:], self._buf[start:start + n - head])
+        self._pos = (self._pos + n) % cap
+        self._filled = min(self._filled + n, cap)
+
+    def latest(self, seconds: float | None = None) -> np.ndarray:
+        """A read-only view of the last `seconds` of audio, or of everything buffered, of shape (samples, channels)."""
+        n = self._filled if seconds is None else min(int(seconds * self.rate), self._filled)
+        end = self._pos + self.capacity
+        view = self._buf[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def to_af(self, seconds: float | None = None) -> av.AudioFrame:
+        """Copy the last `seconds` of audio, or everything buffered, to an s16 AudioFrame."""
+        return _arr2af(self.rate, self.latest(seconds))
+
+    def to_wav(self, seconds: float | None = None) -> io.BytesIO:
+        """Write the last `seconds` of audio, or everything buffered, to a 16-bit wav file, positioned at its start."""
+        wav = io.BytesIO()
+        wavfile.write(wav, self.rate, self.latest(seconds))
+        wav.seek(0)
+        return wav
+
 def make_ast_audio_name(usr_audio_storage_name: str) -> str:
     """From the user's audio storage name, make the name for the character's audio.
     The user's audio storage name MUST be of the form:
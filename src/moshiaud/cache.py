@@ -0,0 +1,200 @@
+""" This module provides a two-tier cache for synthesized audio:
+- BytesCache: an in-memory LRU bounded by total size, in front of an optional on-disk store whose entries expire after a TTL
+- SingleFlight: share one in-flight call among concurrent callers with the same key
+- make_key: a content-addressed key for any tuple of parameters
+"""
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import Future
+import hashlib
+import os
+from pathlib import Path
+import threading
+import time
+
+from loguru import logger
+
+def make_key(*parts) -> str:
+    """Hash the parts, e.g. (text, voice name, language, gender, rate, encoding), to a hex key.
+    Parts are separated by a byte that can't appear in their str(), so ("ab", "c") and ("a", "bc") differ.
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode())
+        digest.update(b'\xff')
+    return digest.hexdigest()
+
+class BytesCache:
+    """Cache bytes by key in memory, evicting least recently used values beyond max_bytes in total.
+    If directory is set, values are also written there, and memory misses are read back from it for ttl seconds;
+    puts sweep expired entries off the disk at most every sweep_interval seconds, so one-off values don't pile up.
+    Thread-safe; disk reads, writes and sweeps happen outside the lock.
+    """
+    def __init__(self, max_bytes: int = 64 * 2**20, directory: str | Path | None = None, ttl: float = 7 * 24 * 3600,
+                 sweep_interval: float = 3600):
+        self.max_bytes = max_bytes
+        self.directory = None if directory is None else Path(directory)
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._swept = 0.0  # NOTE so the first put sweeps what earlier processes left behind
+        self.nbytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lru: OrderedDict[str, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return dict(memory_hits=self.memory_hits, disk_hits=self.disk_hits, misses=self.misses, entries=len(self._lru), nbytes=self.nbytes)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _remember(self, key: str, value: bytes):
+        """Put a value in memory and evict down to max_bytes. Caller holds the lock."""
+        if len(value) > self.max_bytes:
+            return
+        old = self._lru.pop(key, None)
+        if old is not None:
+            self.nbytes -= len(old)
+        self._lru[key] = value
+        self.nbytes += len(value)
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._lru.popitem(last=False)
+            self.nbytes -= len(evicted)
+
+    def _read(self, key: str) -> bytes | None:
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                logger.debug(f"Cache entry expired: {path}")
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, value: bytes):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # NOTE write then rename, so concurrent readers never see a partial file
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(value)
+        os.replace(tmp, path)
+
+    def get(self, key: str) -> bytes | None:
+        """The cached value, or None on a miss."""
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+                self.memory_hits += 1
+                return value
+        value = None if self.directory is None else self._read(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+                self._remember(key, value)
+        return value
+
+    def put(self, key: str, value: bytes):
+        with self._lock:
+            self._remember(key, value)
+            now = time.time()
+            sweep = self.directory is not None and now - self._swept >= self.sweep_interval
+            if sweep:
+                self._swept = now
+        if self.directory is not None:
+            try:
+                self._write(key, value)
+            except OSError as exc:
+                logger.warning(f"Failed to write cache entry to disk: {exc}")
+        if sweep:
+            try:
+                self.sweep()
+            except OSError as exc:
+                logger.warning(f"Failed to sweep expired cache entries: {exc}")
+
+    def sweep(self) -> int:
+        """Delete on-disk entries, and temporary files left by interrupted writes, older than ttl.
+        Returns:
+            The number of files deleted.
+        """
+        if self.directory is None:
+            return 0
+        cutoff = time.time() - self.ttl
+        deleted = 0
+        for path in self.directory.glob("*/*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    deleted += 1
+            except FileNotFoundError:
+                pass  # NOTE expired and deleted by a concurrent get or sweep
+        logger.debug(f"Swept {deleted} expired cache entries from {self.directory}")
+        return deleted
+
+    def clear(self):
+        """Forget everything in memory and reset the counters; the on-disk store is left to expire through sweep()."""
+        with self._lock:
+            self._lru.clear()
+            self.nbytes = self.memory_hits = self.disk_hits = self.misses = 0
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one: the first caller runs it, and the rest wait for its result
+    or exception. Works across threads with do(), and within an event loop with do_async(); nothing is kept once the
+    call finishes, so a later call runs again. Share only immutable results, e.g. bytes or str.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._lock = threading.Lock()
+        self._futures: dict[str, Future] = {}
+        self._tasks: dict[tuple[asyncio.AbstractEventLoop, str], asyncio.Task] = {}
+
+    def do(self, key: str, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs), unless a call with this key is already in flight; then wait for its outcome."""
+        with self._lock:
+            future = self._futures.get(key)
+            leader = future is None
+            if leader:
+                future = self._futures[key] = Future()
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            logger.trace(f"Joining in-flight call: {key}")
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._futures[key]
+
+    async def do_async(self, key: str, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs), unless a call with this key is already in flight on this event loop; then await its outcome.
+        A caller that is cancelled while waiting doesn't cancel the call for the others.
+        """
+        task_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = asyncio.ensure_future(fn(*args, **kwargs))
+                task.add_done_callback(lambda _: self._tasks.pop(task_key, None))
+                self.calls += 1
+            else:
+                self.shared += 1
+                logger.trace(f"Joining in-flight call: {key}")
+        return await asyncio.shield(task)
@@ -1,55 +1,128 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import os
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator, Iterable, Iterator
+import weakref
 
 import av
+from google.api_core.exceptions import ServiceUnavailable, TooManyRequests
 from google.cloud import texttospeech as tts
 from loguru import logger
 
 from moshi import traced
 from . import audio
+from .cache import BytesCache, SingleFlight, make_key
 from .voice import Voice
 
 GOOGLE_SPEECH_SYNTHESIS_TIMEOUT = int(os.getenv("GOOGLE_SPEECH_SYNTHESIS_TIMEOUT", 5))
+SYNTHESIS_STREAM_CONCURRENCY = int(os.getenv("SYNTHESIS_STREAM_CONCURRENCY", 4))
+SYNTHESIS_MANY_CONCURRENCY = int(os.getenv("SYNTHESIS_MANY_CONCURRENCY", 16))
+SYNTHESIS_MANY_QPS = float(os.getenv("SYNTHESIS_MANY_QPS", 15))  # NOTE the default quota is 1000 requests per minute
+SYNTHESIS_MANY_RETRIES = int(os.getenv("SYNTHESIS_MANY_RETRIES", 5))
+SYNTHESIS_CACHE_BYTES = int(os.getenv("SYNTHESIS_CACHE_BYTES", 64 * 2**20))
+SYNTHESIS_CACHE_DIR = os.getenv("SYNTHESIS_CACHE_DIR")  # NOTE unset keeps the cache in memory only
+SYNTHESIS_CACHE_TTL = float(os.getenv("SYNTHESIS_CACHE_TTL", 7 * 24 * 3600))
+logger.info(f"SYNTHESIS_CACHE_BYTES={SYNTHESIS_CACHE_BYTES} SYNTHESIS_CACHE_DIR={SYNTHESIS_CACHE_DIR} SYNTHESIS_CACHE_TTL={SYNTHESIS_CACHE_TTL}")
 
 client = tts.TextToSpeechClient()
+# NOTE async clients are bound to the event loop that creates them, so each loop gets its own, dropped with the loop
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tts.TextToSpeechAsyncClient] = weakref.WeakKeyDictionary()
+cache = BytesCache(max_bytes=SYNTHESIS_CACHE_BYTES, directory=SYNTHESIS_CACHE_DIR, ttl=SYNTHESIS_CACHE_TTL)
+inflight = SingleFlight()  # NOTE identical concurrent requests share one API call
 
-def _synthesize_bytes(text: str, voice: tts.Voice, rate: int = 24000) -> bytes:
-    """Synthesize speech to a bytestring in WAV (PCM_16) format.
-    Implemented with tts.googleapis.com;
-    """
+def _synthesis_request(text: str, voice: tts.Voice, rate: int = 24000) -> tuple[str, dict]:
+    """The cache key and the request for synthesizing speech in WAV (PCM_16) format."""
     logger.debug(f"text={text} voice={voice} rate={rate}")
+    encoding = tts.AudioEncoding.LINEAR16  # NOTE fixed s16 format
+    langcode = voice.language_codes[0]
+    logger.trace(f"Extracted language code from voice: {langcode}")
+    key = make_key(text, voice.name, langcode, voice.ssml_gender, rate, encoding)
     synthesis_input = tts.SynthesisInput(text=text)
     audio_config = tts.AudioConfig(
-        audio_encoding=tts.AudioEncoding.LINEAR16,  # NOTE fixed s16 format
+        audio_encoding=encoding,
         sample_rate_hertz=rate,
     )
-    langcode = voice.language_codes[0]
-    logger.trace(f"Extracted language code from voice: {langcode}")
     voice_selector = tts.VoiceSelectionParams(
         name=voice.name,
         language_code=langcode,
         ssml_gender=voice.ssml_gender,
     )
-    with logger.contextualize(voice_selector=voice_selector, audio_config=audio_config):
-        logger.trace(f"Synthesizing speech for: {synthesis_input}")
-        request = dict(
-            input=synthesis_input,
-            voice=voice_selector,
-            audio_config=audio_config,
-        )
+    request = dict(
+        input=synthesis_input,
+        voice=voice_selector,
+        audio_config=audio_config,
+    )
+    return key, request
+
+def _cached(key: str, use_cache: bool) -> bytes | None:
+    if not use_cache:
+        return None
+    cached = cache.get(key)
+    if cached is not None:
+        logger.trace(f"Synthesis cache hit: {cache.stats}")
+    return cached
+
+def _synthesize_bytes(text: str, voice: tts.Voice, rate: int = 24000, use_cache: bool = True, limiter: "_TokenBucket | None" = None) -> bytes:
+    """Synthesize speech to a bytestring in WAV (PCM_16) format.
+    Implemented with tts.googleapis.com; repeated requests are served from the cache unless use_cache is False,
+    and concurrent identical requests share one API call.
+    If a limiter is given, a token is taken from it before calling the API; cache hits and shared calls don't take one.
+    """
+    key, request = _synthesis_request(text, voice, rate)
+    return inflight.do(key, _cached_or_call_api, key, request, use_cache, limiter)
+
+def _cached_or_call_api(key: str, request: dict, use_cache: bool, limiter: "_TokenBucket | None") -> bytes:
+    # NOTE looked up inside the shared call, so callers that join it aren't each counted as a cache miss
+    cached = _cached(key, use_cache)
+    if cached is not None:
+        return cached
+    return _call_api(key, request, use_cache, limiter)
+
+def _call_api(key: str, request: dict, use_cache: bool, limiter: "_TokenBucket | None") -> bytes:
+    if limiter is not None:
+        limiter.acquire()
+    with logger.contextualize(voice_selector=request["voice"], audio_config=request["audio_config"]):
+        logger.trace(f"Synthesizing speech for: {request['input']}")
         response = client.synthesize_speech(request=request, timeout=GOOGLE_SPEECH_SYNTHESIS_TIMEOUT)
         logger.trace(f"Synthesized speech: {len(response.audio_content)} bytes")
+    if use_cache:
+        cache.put(key, response.audio_content)
+        logger.trace(f"Synthesis cache miss: {cache.stats}")
     return response.audio_content
 
-def _synthesize_af(text: str, voice: tts.Voice, rate: int = 24000) -> av.AudioFrame:
-    audio_bytes = _synthesize_bytes(text, voice, rate)
+def _from_wav(audio_bytes: bytes, to: str) -> av.AudioFrame | audio.AudioClip | bytes:
+    if to == "audio_frame":
+        return audio.wav2af(audio_bytes)
+    elif to == "clip":
+        return audio.wav2clip(audio_bytes)
+    elif to == "bytes":
+        return audio_bytes
+    else:
+        raise ValueError(f"Invalid value for 'to': {to}")
+
+def _synthesize_af(text: str, voice: tts.Voice, rate: int = 24000, use_cache: bool = True) -> av.AudioFrame:
+    audio_bytes = _synthesize_bytes(text, voice, rate, use_cache)
     audio_frame = audio.wav2af(audio_bytes)
     return audio_frame
 
+def _synthesize_clip(text: str, voice: tts.Voice, rate: int = 24000, use_cache: bool = True) -> audio.AudioClip:
+    audio_bytes = _synthesize_bytes(text, voice, rate, use_cache)
+    return audio.wav2clip(audio_bytes)
+
 @traced
-def synthesize(text: str, voice: Voice, rate: int = 24000, to="audio_frame") -> av.AudioFrame | bytes:
+def synthesize(text: str, voice: Voice, rate: int = 24000, to="audio_frame", use_cache: bool = True) -> av.AudioFrame | audio.AudioClip | bytes:
     """Synthesize speech to an AudioFrame or Storage.
+    Repeated (text, voice, rate) requests are served from `cache`, in memory and, if SYNTHESIS_CACHE_DIR is set, on disk;
+    its hit and miss counters are in cache.stats, and callers that joined an identical request in flight are counted in
+    inflight.shared instead. Pass use_cache=False to always call the API.
     Returns:
         - AudioFrame: if to == "audio_frame"
+        - AudioClip: if to == "clip"; a view of the synthesized samples, for numeric work without PyAV
         - bytes: raw WAV format audio if to == "bytes"
     Raises:
         - ValueError if to is invalid.
@@ -57,11 +130,205 @@ def synthesize(text: str, voice: Voice, rate: int = 24000, to="audio_frame") ->
     voice = voice._tts_voice
     with logger.contextualize(text=text, voice=voice, rate=rate, to=to):
         if to == "audio_frame":
-            result = _synthesize_af(text, voice, rate)
+            result = _synthesize_af(text, voice, rate, use_cache)
+        elif to == "clip":
+            result = _synthesize_clip(text, voice, rate, use_cache)
         elif to == "bytes":
-            result = _synthesize_bytes(text, voice, rate)
+            result = _synthesize_bytes(text, voice, rate, use_cache)
         else:
             raise ValueError(f"Invalid value for 'to': {to}")
         logger.trace(f"synthesized speech: {type(result)}")
-        assert isinstance(result, (av.AudioFrame, bytes, str))
+        assert isinstance(result, (av.AudioFrame, audio.AudioClip, bytes, str))
     return result
+
+def _get_async_client() -> tts.TextToSpeechAsyncClient:
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None:
+        async_client = _async_clients[loop] = tts.TextToSpeechAsyncClient()
+        logger.info("Async text-to-speech client initialized")
+    return async_client
+
+async def _cached_async(key: str, use_cache: bool) -> bytes | None:
+    """Like _cached, but reads the on-disk store, if any, in a worker thread so the event loop isn't blocked."""
+    if cache.directory is None:
+        return _cached(key, use_cache)
+    return await asyncio.to_thread(_cached, key, use_cache)
+
+async def _synthesize_bytes_async(text: str, voice: tts.Voice, rate: int = 24000, use_cache: bool = True) -> bytes:
+    """Synthesize speech to a bytestring in WAV (PCM_16) format without blocking the event loop.
+    Same request, timeout, cache and coalescing as _synthesize_bytes, via the async client.
+    """
+    key, request = _synthesis_request(text, voice, rate)
+    return await inflight.do_async(key, _cached_or_call_api_async, key, request, use_cache)
+
+async def _cached_or_call_api_async(key: str, request: dict, use_cache: bool) -> bytes:
+    cached = await _cached_async(key, use_cache)
+    if cached is not None:
+        return cached
+    return await _call_api_async(key, request, use_cache)
+
+async def _call_api_async(key: str, request: dict, use_cache: bool) -> bytes:
+    with logger.contextualize(voice_selector=request["voice"], audio_config=request["audio_config"]):
+        logger.trace(f"Synthesizing speech for: {request['input']}")
+        response = await _get_async_client().synthesize_speech(request=request, timeout=GOOGLE_SPEECH_SYNTHESIS_TIMEOUT)
+        logger.trace(f"Synthesized speech: {len(response.audio_content)} bytes")
+    if use_cache:
+        if cache.directory is None:
+            cache.put(key, response.audio_content)
+        else:
+            await asyncio.to_thread(cache.put, key, response.audio_content)
+        logger.trace(f"Synthesis cache miss: {cache.stats}")
+    return response.audio_content
+
+async def synthesize_async(text: str, voice: Voice, rate: int = 24000, to="audio_frame", use_cache: bool = True) -> av.AudioFrame | audio.AudioClip | bytes:
+    """Synthesize speech like synthesize, but as a coroutine, so one event loop can have many requests in flight.
+    Each event loop gets its own async client, so it's safe to call from successive asyncio.run()s.
+    Returns:
+        - AudioFrame: if to == "audio_frame"
+        - AudioClip: if to == "clip"
+        - bytes: raw WAV format audio if to == "bytes"
+    Raises:
+        - ValueError if to is invalid.
+    """
+    if to not in ("audio_frame", "clip", "bytes"):
+        raise ValueError(f"Invalid value for 'to': {to}")
+    voice = voice._tts_voice
+    with logger.contextualize(text=text, voice=voice, rate=rate, to=to):
+        audio_bytes = await _synthesize_bytes_async(text, voice, rate, use_cache)
+        result = _from_wav(audio_bytes, to)
+        logger.trace(f"synthesized speech: {type(result)}")
+    return result
+
+_SENTENCE_END = re.compile(r'(?<=[.!?;])\s+|(?<=[。！？；])')
+
+def _sentences(text: str) -> list[str]:
+    """Split text after sentence and clause ends, including CJK punctuation, which isn't followed by a space."""
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+def synthesize_stream(text: str, voice: Voice, rate: int = 24000, to="audio_frame", max_concurrency: int = SYNTHESIS_STREAM_CONCURRENCY, use_cache: bool = True) -> Iterator[av.AudioFrame | audio.AudioClip | bytes]:
+    """Synthesize speech sentence by sentence, so playback can start after the first sentence rather than the whole text.
+    Up to max_concurrency sentences are synthesized at once in threads; the results are yielded in order, each as soon
+    as it and the ones before it are ready. Closing the generator cancels the sentences that haven't started.
+    Yields:
+        - one synthesize(sentence, voice, rate, to) result per sentence.
+    Raises:
+        - ValueError if to is invalid.
+    """
+    if to not in ("audio_frame", "clip", "bytes"):
+        raise ValueError(f"Invalid value for 'to': {to}")
+    sentences = iter(_sentences(text))
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="synthesize") as pool:
+        pending = deque()
+        def submit():
+            sentence = next(sentences, None)
+            if sentence is not None:
+                pending.append(pool.submit(synthesize, sentence, voice, rate, to, use_cache))
+        for _ in range(max_concurrency):
+            submit()
+        try:
+            while pending:
+                result = pending.popleft().result()
+                submit()
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+async def synthesize_stream_async(text: str, voice: Voice, rate: int = 24000, to="audio_frame", max_concurrency: int = SYNTHESIS_STREAM_CONCURRENCY, use_cache: bool = True) -> AsyncIterator[av.AudioFrame | audio.AudioClip | bytes]:
+    """Like synthesize_stream, but as an async generator over synthesize_async; no threads are used.
+    Raises:
+        - ValueError if to is invalid.
+    """
+    if to not in ("audio_frame", "clip", "bytes"):
+        raise ValueError(f"Invalid value for 'to': {to}")
+    sentences = iter(_sentences(text))
+    pending = deque()
+    def submit():
+        sentence = next(sentences, None)
+        if sentence is not None:
+            pending.append(asyncio.ensure_future(synthesize_async(sentence, voice, rate, to, use_cache)))
+    for _ in range(max_concurrency):
+        submit()
+    try:
+        while pending:
+            result = await pending.popleft()
+            submit()
+            yield result
+    finally:
+        for task in pending:
+            task.cancel()
+
+class _TokenBucket:
+    """Let callers through at qps on average, with bursts of up to `burst`. Thread-safe; acquire() sleeps outside the lock."""
+    def __init__(self, qps: float, burst: float | None = None):
+        self.qps = qps
+        self.capacity = burst or max(1.0, qps)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.qps)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.qps
+            time.sleep(wait)
+
+def _synthesize_retrying(text: str, voice: tts.Voice, rate: int, to: str, use_cache: bool, limiter: _TokenBucket | None, retries: int):
+    """Synthesize, retrying quota and availability errors with jittered exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return _from_wav(_synthesize_bytes(text, voice, rate, use_cache, limiter), to)
+        except (TooManyRequests, ServiceUnavailable) as exc:
+            if attempt == retries:
+                raise
+            delay = 2 ** attempt * (1 + random.random())
+            logger.warning(f"Synthesis failed with {type(exc).__name__}, retry {attempt + 1}/{retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+def synthesize_as_completed(items: Iterable[str], voice: Voice, rate: int = 24000, to="audio_frame", max_concurrency: int = SYNTHESIS_MANY_CONCURRENCY, qps: float | None = SYNTHESIS_MANY_QPS, retries: int = SYNTHESIS_MANY_RETRIES, use_cache: bool = True) -> Iterator[tuple[int, av.AudioFrame | audio.AudioClip | bytes]]:
+    """Synthesize many texts in a thread pool, yielding each result as soon as it's ready.
+    Args:
+        - items: the texts to synthesize.
+        - max_concurrency: the most requests in flight at once.
+        - qps: the most API calls per second, on average; None for no limit. Cache hits aren't counted.
+        - retries: how many times to retry a text after quota (429) or availability (503) errors.
+    Yields:
+        - (index, result): the index of the text in items, and its synthesize(text, voice, rate, to) result.
+    Raises:
+        - ValueError if to is invalid.
+        - the first error that isn't retried, or persists; texts that haven't started are cancelled.
+    """
+    if to not in ("audio_frame", "clip", "bytes"):
+        raise ValueError(f"Invalid value for 'to': {to}")
+    tts_voice = voice._tts_voice
+    limiter = None if qps is None else _TokenBucket(qps)
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="synthesize") as pool:
+        futures = {
+            pool.submit(_synthesize_retrying, text, tts_voice, rate, to, use_cache, limiter, retries): i
+            for i, text in enumerate(items)
+        }
+        logger.debug(f"Synthesizing {len(futures)} texts: max_concurrency={max_concurrency} qps={qps}")
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+def synthesize_many(items: Iterable[str], voice: Voice, rate: int = 24000, to="audio_frame", max_concurrency: int = SYNTHESIS_MANY_CONCURRENCY, qps: float | None = SYNTHESIS_MANY_QPS, retries: int = SYNTHESIS_MANY_RETRIES, use_cache: bool = True) -> list[av.AudioFrame | audio.AudioClip | bytes]:
+    """Synthesize many texts concurrently, e.g. a batch of lesson sentences; see synthesize_as_completed.
+    Returns:
+        - the results, in the order of items.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    for i, result in synthesize_as_completed(items, voice, rate, to, max_concurrency, qps, retries, use_cache):
+        results[i] = result
+    return results
@@ -1,28 +1,75 @@
+import hashlib
 from pathlib import Path
+import struct
 
+import av
 from google.cloud import speech as stt
 from loguru import logger
 
 from moshi import traced
+from . import audio
+from .cache import SingleFlight, make_key
 from .exceptions import TranscriptionError
 
 client = stt.SpeechClient()
 logger.info(f"Speech client initialized")
+inflight = SingleFlight()  # NOTE identical concurrent requests share one API call
 
-@traced
-def transcribe(aud: str | Path | bytes, bcp47: str) -> str:
-    """Transcribe audio to text using Google Cloud Speech-to-Text.
-    Args:
-        - aud: audio GCP Storage path  e.g. "gs://moshi-audio/activities/1/1/1.wav"
-        - bcp47: BCP 47 language code e.g. "en-US" https://www.rfc-editor.org/rfc/bcp/bcp47.txt
-    Notes:
-        - https://cloud.google.com/speech-to-text/docs/error-messages
-            - "Invalid recognition 'config': bad encoding"
-        - https://cloud.google.com/speech-to-text/docs/troubleshooting#returns_an_empty_response
-            - Usually it's the emulator's mic being disabled...
+def _trim(af: av.AudioFrame) -> av.AudioFrame:
+    """Trim leading and trailing silence.
+    Raises:
+        - TranscriptionError if the audio is silent.
+    """
+    if audio.is_silent(af):
+        raise TranscriptionError("Audio is silent; not sent for transcription.")
+    return audio.trim_silence(af)
+
+def _vad(aud: bytes) -> bytes:
+    """Trim leading and trailing silence from WAV audio before it is sent for transcription.
+    The trimmed audio is returned as mono flac, like an AudioFrame; non-WAV audio (e.g. flac) and WAVs with truncated headers are returned unchanged.
+    Raises:
+        - TranscriptionError if the audio is silent.
     """
+    try:
+        af = audio.wav2af(aud)
+    except (ValueError, struct.error) as exc:
+        logger.debug(f"Skipping VAD for non-WAV audio, or a truncated header: {exc}")
+        return aud
+    af = _trim(af)
+    flac = _af2content(af)
+    logger.debug(f"VAD trimmed audio from {len(aud)} to {len(flac)} bytes")
+    return flac
+
+def _af2content(af: av.AudioFrame) -> bytes:
+    """Encode an AudioFrame as mono flac, which Speech-to-Text reads without further config."""
+    if af.layout.name in ("mono", "stereo"):
+        # NOTE downmixed in NumPy rather than with a new av.AudioResampler per call
+        return audio.encode(audio.AudioClip(audio._s16_ndarray(af, 1, af.rate), af.rate), codec="flac")
+    converter = audio.AudioConverter(format="s16", layout="mono", rate=af.rate)
+    return audio.encode(converter.convert(af) + converter.flush(), codec="flac")
+
+def _transcription_key(aud: str | Path | bytes | av.AudioFrame, bcp47: str, vad: bool) -> str:
+    """Identify a transcription request by its decoded audio rather than its encoding, so re-encoded wavs coalesce."""
+    if isinstance(aud, (str, Path)):
+        content = str(aud)
+    elif isinstance(aud, av.AudioFrame):
+        content = audio.content_hash(aud)
+    elif isinstance(aud, bytes):
+        try:
+            content = audio.content_hash(aud)
+        except (ValueError, struct.error):
+            content = hashlib.sha256(aud).hexdigest()  # NOTE not wav (e.g. flac), or a truncated header
+    else:
+        raise TypeError(f"Invalid type for 'aud': {type(aud)}")
+    return make_key(type(aud).__name__, content, bcp47, vad)
+
+def _transcribe(aud: str | Path | bytes | av.AudioFrame, bcp47: str, vad: bool = False) -> str:
     if isinstance(aud, Path):
         aud = str(aud)
+    elif isinstance(aud, av.AudioFrame):
+        if vad:
+            aud = _trim(aud)
+        aud, vad = _af2content(aud), False
     with logger.contextualize(aud=aud if isinstance(aud, str) else 'bytes ommitted', bcp47=bcp47):
         if isinstance(aud, str):
             if not aud.startswith('gs://'):
@@ -31,6 +78,8 @@ def transcribe(aud: str | Path | bytes, bcp47: str) -> str:
             config = stt.RecognitionConfig(language_code=bcp47)
             audio = stt.RecognitionAudio(uri=aud)
         elif isinstance(aud, bytes):
+            if vad:
+                aud = _vad(aud)
             config = stt.RecognitionConfig(
                 # NOTE wav and flac get encoding and sample rate from the file headers.
                 # encoding=stt.RecognitionConfig.AudioEncoding.LINEAR16,
@@ -51,4 +100,23 @@ def transcribe(aud: str | Path | bytes, bcp47: str) -> str:
             raise TranscriptionError("No transcription found. Usually this means silent audio, but it could be corrupted audio.") from exc
         with logger.contextualize(confidence=conf):
             logger.log("TRANSCRIPT", text)
-        return text
\ No newline at end of file
+        return text
+
+@traced
+def transcribe(aud: str | Path | bytes | av.AudioFrame, bcp47: str, vad: bool = False) -> str:
+    """Transcribe audio to text using Google Cloud Speech-to-Text.
+    Concurrent calls for the same audio content and bcp47 share one API call, e.g. when many users start the same lesson.
+    Args:
+        - aud: audio GCP Storage path  e.g. "gs://moshi-audio/activities/1/1/1.wav"; or wav or flac bytes; or an AudioFrame, which is sent as mono flac
+        - bcp47: BCP 47 language code e.g. "en-US" https://www.rfc-editor.org/rfc/bcp/bcp47.txt
+        - vad: if True, trim leading and trailing silence from WAV bytes or AudioFrames before sending them, and fail fast on silent audio without calling the API. Ignored for storage paths.
+    Raises:
+        - TranscriptionError if no transcription is found, or if vad is set and the audio is silent.
+    Notes:
+        - https://cloud.google.com/speech-to-text/docs/error-messages
+            - "Invalid recognition 'config': bad encoding"
+        - https://cloud.google.com/speech-to-text/docs/troubleshooting#returns_an_empty_response
+            - Usually it's the emulator's mic being disabled...
+    """
+    key = _transcription_key(aud, bcp47, vad)
+    return inflight.do(key, _transcribe, aud, bcp47, vad)
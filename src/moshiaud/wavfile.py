@@ -6,20 +6,38 @@ Functions
 ---------
 `read`: Return the sample rate (in samples/sec) and data from a WAV file.
 
+`read_range`: Return the sample rate and a range of frames from a WAV file.
+
+`read_many`: Decode many WAV files into one padded array plus lengths.
+
+`info`: Return the format, rate and length of a WAV file from its header.
+
+`iter_blocks`: Return the sample rate and a generator over blocks of data.
+
 `write`: Write a NumPy array as a WAV file.
 
+`WavWriter`: Write a WAV file incrementally, block by block.
+
 """
 import io
 import sys
 import numpy
 import struct
 import warnings
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from enum import IntEnum
 
 
 __all__ = [
     'WavFileWarning',
+    'WavInfo',
+    'WavWriter',
+    'info',
+    'iter_blocks',
     'read',
+    'read_many',
+    'read_range',
     'write'
 ]
 
@@ -305,7 +323,67 @@ class WAVE_FORMAT(IntEnum):
     DEVELOPMENT = 0xFFFF
 
 
-KNOWN_WAVE_FORMATS = {WAVE_FORMAT.PCM, WAVE_FORMAT.IEEE_FLOAT}
+KNOWN_WAVE_FORMATS = {WAVE_FORMAT.PCM, WAVE_FORMAT.IEEE_FLOAT,
+                      WAVE_FORMAT.MULAW, WAVE_FORMAT.ALAW}
+
+G711_FORMATS = {WAVE_FORMAT.MULAW, WAVE_FORMAT.ALAW}
+
+
+def _ulaw_tables():
+    """
+    ITU-T G.711 mu-law lookup tables, vectorized from the reference
+    ulaw2linear / linear2ulaw routines.
+
+    Returns
+    -------
+    decode : numpy array
+        256 int16 samples, indexed by the encoded byte.
+    encode : numpy array
+        65536 encoded bytes, indexed by the int16 sample viewed as uint16.
+    """
+    u = ~numpy.arange(256, dtype=numpy.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    decode = numpy.where(u & 0x80, 0x84 - t, t - 0x84).astype(numpy.int16)
+
+    pcm = numpy.arange(65536, dtype=numpy.uint16).view(numpy.int16)
+    pcm = pcm.astype(numpy.int32) >> 2
+    mask = numpy.where(pcm < 0, 0x7F, 0xFF)
+    pcm = numpy.minimum(numpy.abs(pcm), 8159) + (0x84 >> 2)
+    seg_end = [0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]
+    seg = numpy.searchsorted(seg_end, pcm)
+    uval = (seg << 4) | ((pcm >> (seg + 1)) & 0x0F)
+    uval = numpy.where(seg >= 8, 0x7F, uval)
+    encode = (uval ^ mask).astype(numpy.uint8)
+    return decode, encode
+
+
+def _alaw_tables():
+    """
+    ITU-T G.711 A-law lookup tables, vectorized from the reference
+    alaw2linear / linear2alaw routines.  See `_ulaw_tables`.
+    """
+    a = numpy.arange(256, dtype=numpy.int32) ^ 0x55
+    seg = (a & 0x70) >> 4
+    t = (a & 0x0F) << 4
+    t = numpy.where(seg == 0, t + 8, (t + 0x108) << numpy.maximum(seg - 1, 0))
+    decode = numpy.where(a & 0x80, t, -t).astype(numpy.int16)
+
+    pcm = numpy.arange(65536, dtype=numpy.uint16).view(numpy.int16)
+    pcm = pcm.astype(numpy.int32) >> 3
+    mask = numpy.where(pcm >= 0, 0xD5, 0x55)
+    pcm = numpy.where(pcm >= 0, pcm, -pcm - 1)
+    seg_end = [0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF]
+    seg = numpy.searchsorted(seg_end, pcm)
+    aval = (seg << 4) | ((pcm >> numpy.maximum(seg, 1)) & 0x0F)
+    aval = numpy.where(seg >= 8, 0x7F, aval)
+    encode = (aval ^ mask).astype(numpy.uint8)
+    return decode, encode
+
+
+_G711_DECODE = {}
+_G711_ENCODE = {}
+_G711_DECODE[WAVE_FORMAT.MULAW], _G711_ENCODE[WAVE_FORMAT.MULAW] = _ulaw_tables()
+_G711_DECODE[WAVE_FORMAT.ALAW], _G711_ENCODE[WAVE_FORMAT.ALAW] = _alaw_tables()
 
 
 def _raise_bad_format(format_tag):
@@ -397,8 +475,146 @@ def _read_fmt_chunk(fid, is_big_endian):
             bit_depth)
 
 
+def _data_dtype(format_tag, bit_depth, bytes_per_sample, is_big_endian):
+    """
+    Returns
+    -------
+    dtype : str
+        numpy dtype used to load the raw samples of the data subchunk. 'V1'
+        means there is no compatible dtype and the samples must be loaded as
+        raw bytes and passed through `_rearrange_odd_width`.  mu-law and
+        A-law bytes are loaded as 'u1' and expanded via `_G711_DECODE`.
+    """
+    if is_big_endian:
+        fmt = '>'
+    else:
+        fmt = '<'
+
+    if format_tag == WAVE_FORMAT.PCM:
+        if 1 <= bit_depth <= 8:
+            dtype = 'u1'  # WAV of 8-bit integer or less are unsigned
+        elif bytes_per_sample in {3, 5, 6, 7}:
+            # No compatible dtype.  Load as raw bytes for reshaping later.
+            dtype = 'V1'
+        elif bit_depth <= 64:
+            # Remaining bit depths can map directly to signed numpy dtypes
+            dtype = f'{fmt}i{bytes_per_sample}'
+        else:
+            raise ValueError("Unsupported bit depth: the WAV file "
+                             f"has {bit_depth}-bit integer data.")
+    elif format_tag == WAVE_FORMAT.IEEE_FLOAT:
+        if bit_depth in {32, 64}:
+            dtype = f'{fmt}f{bytes_per_sample}'
+        else:
+            raise ValueError("Unsupported bit depth: the WAV file "
+                             f"has {bit_depth}-bit floating-point data.")
+    elif format_tag in G711_FORMATS:
+        if bit_depth == 8 and bytes_per_sample == 1:
+            # Encoded bytes; expanded with `_G711_DECODE` after loading
+            dtype = 'u1'
+        else:
+            raise ValueError("Unsupported bit depth: the WAV file has "
+                             f"{bit_depth}-bit {WAVE_FORMAT(format_tag).name} "
+                             "data.")
+    else:
+        _raise_bad_format(format_tag)
+
+    return dtype
+
+
+def _odd_width_dtype(bytes_per_sample, is_big_endian):
+    """The smallest numpy dtype that holds `bytes_per_sample` bytes."""
+    if is_big_endian:
+        fmt = '>'
+    else:
+        fmt = '<'
+    return numpy.dtype(f'{fmt}i4' if bytes_per_sample == 3 else f'{fmt}i8')
+
+
+def _rearrange_odd_width(data, bytes_per_sample, is_big_endian, out=None):
+    """
+    Rearrange raw 'V1' bytes into the smallest compatible numpy dtype.
+
+    Parameters
+    ----------
+    out : numpy array, optional
+        Preallocated output of `_odd_width_dtype` with one element per
+        sample in `data`.
+
+    Notes
+    -----
+    Samples are left-justified: 24-bit data lands in the top three bytes of
+    an int32 and the low byte is zero.  The packed bytes are copied with a
+    single strided assignment into the preallocated output, so no
+    intermediate arrays are allocated.
+    """
+    dt = _odd_width_dtype(bytes_per_sample, is_big_endian)
+    n_samples = len(data) // bytes_per_sample
+    raw = data.view('u1')[:n_samples * bytes_per_sample]
+    raw = raw.reshape(n_samples, bytes_per_sample)
+
+    if out is None:
+        out = numpy.empty(n_samples, dtype=dt)
+    out_bytes = out.view('u1').reshape(n_samples, dt.itemsize)
+    if is_big_endian:
+        out_bytes[:, :bytes_per_sample] = raw
+        out_bytes[:, bytes_per_sample:] = 0
+    else:
+        out_bytes[:, :-bytes_per_sample] = 0
+        out_bytes[:, -bytes_per_sample:] = raw
+    return out
+
+
+# samples per block when reading odd-width data from a file
+_ODD_WIDTH_BLOCK = 1 << 16
+
+
+def _read_odd_width(fid, size, bytes_per_sample, is_big_endian):
+    """
+    Read `size` bytes of raw 'V1' samples from a file, block by block, into
+    the preallocated output of `_rearrange_odd_width`.
+
+    Notes
+    -----
+    Peak memory is the output plus one block of raw bytes, rather than the
+    output plus all of the raw bytes.  A truncated file yields the complete
+    samples that were read.
+    """
+    n_samples = size // bytes_per_sample
+    out = numpy.empty(n_samples,
+                      dtype=_odd_width_dtype(bytes_per_sample, is_big_endian))
+    block = numpy.empty(min(n_samples, _ODD_WIDTH_BLOCK) * bytes_per_sample,
+                        dtype='u1')
+    done = 0
+    while done < n_samples:
+        want = min(_ODD_WIDTH_BLOCK, n_samples - done) * bytes_per_sample
+        view = memoryview(block)[:want]
+        got = 0
+        while got < want:
+            n = fid.readinto(view[got:])
+            if not n:
+                break
+            got += n
+        k = got // bytes_per_sample
+        _rearrange_odd_width(block[:k * bytes_per_sample], bytes_per_sample,
+                             is_big_endian, out=out[done:done + k])
+        done += k
+        if got < want:
+            break
+    return out[:done]
+
+
+def _pack_int24(data):
+    """
+    Inverse of `_rearrange_odd_width` for 24-bit samples: the top three
+    bytes of each little-endian int32, as an (Nsamples, 3) uint8 view.
+    """
+    data = numpy.ascontiguousarray(data, dtype='<i4')
+    return data.view('u1').reshape(-1, 4)[:, 1:]
+
+
 def _read_data_chunk(fid, format_tag, channels, bit_depth, is_big_endian,
-                     block_align, mmap=False):
+                     block_align, mmap=False, ds64_data_size=None):
     """
     Notes
     -----
@@ -430,53 +646,41 @@ def _read_data_chunk(fid, format_tag, channels, bit_depth, is_big_endian,
 
     # Size of the data subchunk in bytes
     size = struct.unpack(fmt+'I', fid.read(4))[0]
+    if size == 0xFFFFFFFF and ds64_data_size is not None:
+        # RF64: the real size is in the ds64 chunk
+        size = ds64_data_size
 
     # Number of bytes per sample (sample container size)
     bytes_per_sample = block_align // channels
     n_samples = size // bytes_per_sample
 
-    if format_tag == WAVE_FORMAT.PCM:
-        if 1 <= bit_depth <= 8:
-            dtype = 'u1'  # WAV of 8-bit integer or less are unsigned
-        elif bytes_per_sample in {3, 5, 6, 7}:
-            # No compatible dtype.  Load as raw bytes for reshaping later.
-            dtype = 'V1'
-        elif bit_depth <= 64:
-            # Remaining bit depths can map directly to signed numpy dtypes
-            dtype = f'{fmt}i{bytes_per_sample}'
-        else:
-            raise ValueError("Unsupported bit depth: the WAV file "
-                             f"has {bit_depth}-bit integer data.")
-    elif format_tag == WAVE_FORMAT.IEEE_FLOAT:
-        if bit_depth in {32, 64}:
-            dtype = f'{fmt}f{bytes_per_sample}'
-        else:
-            raise ValueError("Unsupported bit depth: the WAV file "
-                             f"has {bit_depth}-bit floating-point data.")
-    else:
-        _raise_bad_format(format_tag)
+    dtype = _data_dtype(format_tag, bit_depth, bytes_per_sample, is_big_endian)
 
     start = fid.tell()
     if not mmap:
-        try:
-            count = size if dtype == 'V1' else n_samples
-            data = numpy.fromfile(fid, dtype=dtype, count=count)
-        except io.UnsupportedOperation:  # not a C-like file
-            fid.seek(start, 0)  # just in case it seeked, though it shouldn't
-            data = numpy.frombuffer(fid.read(size), dtype=dtype)
-
-        if dtype == 'V1':
-            # Rearrange raw bytes into smallest compatible numpy dtype
-            dt = f'{fmt}i4' if bytes_per_sample == 3 else f'{fmt}i8'
-            a = numpy.zeros((len(data) // bytes_per_sample, numpy.dtype(dt).itemsize),
-                            dtype='V1')
-            if is_big_endian:
-                a[:, :bytes_per_sample] = data.reshape((-1, bytes_per_sample))
-            else:
-                a[:, -bytes_per_sample:] = data.reshape((-1, bytes_per_sample))
-            data = a.view(dt).reshape(a.shape[:-1])
+        if isinstance(fid, _BufferReader):
+            # view into the caller's buffer, no copy
+            data = numpy.frombuffer(fid.read_view(size), dtype=dtype)
+        elif dtype == 'V1' and hasattr(fid, 'readinto'):
+            # decoded block by block, so the raw bytes are never all in memory
+            data = _read_odd_width(fid, size, bytes_per_sample, is_big_endian)
+        else:
+            try:
+                count = size if dtype == 'V1' else n_samples
+                data = numpy.fromfile(fid, dtype=dtype, count=count)
+            except io.UnsupportedOperation:  # not a C-like file
+                fid.seek(start, 0)  # just in case it seeked, though it shouldn't
+                data = numpy.frombuffer(fid.read(size), dtype=dtype)
+
+        if data.dtype.kind == 'V':
+            data = _rearrange_odd_width(data, bytes_per_sample, is_big_endian)
+        elif format_tag in G711_FORMATS:
+            data = _G711_DECODE[format_tag][data]
     else:
-        if bytes_per_sample in {1, 2, 4, 8}:
+        if format_tag in G711_FORMATS:
+            raise ValueError("mmap=True not compatible with "
+                             f"{WAVE_FORMAT(format_tag).name} data.")
+        elif bytes_per_sample in {1, 2, 4, 8}:
             start = fid.tell()
             data = numpy.memmap(fid, dtype=dtype, mode='c', offset=start,
                                 shape=(n_samples,))
@@ -510,8 +714,24 @@ def _skip_unknown_chunk(fid, is_big_endian):
 
 
 def _read_riff_chunk(fid):
+    """
+    Returns
+    -------
+    file_size : int
+        size of the entire file in bytes, as declared in the header
+    is_big_endian : bool
+        whether the file is RIFX
+    data_size : int or None
+        64-bit size of the data subchunk from the ds64 chunk of an RF64
+        file, or None for RIFF and RIFX files
+
+    Notes
+    -----
+    RF64 (EBU Tech 3306) files keep their 32-bit size fields at 0xFFFFFFFF
+    and carry the real sizes in a ds64 chunk that must come first.
+    """
     str1 = fid.read(4)  # File signature
-    if str1 == b'RIFF':
+    if str1 in {b'RIFF', b'RF64'}:
         is_big_endian = False
         fmt = '<I'
     elif str1 == b'RIFX':
@@ -520,7 +740,7 @@ def _read_riff_chunk(fid):
     else:
         # There are also .wav files with "FFIR" or "XFIR" signatures?
         raise ValueError(f"File format {repr(str1)} not understood. Only "
-                         "'RIFF' and 'RIFX' supported.")
+                         "'RIFF', 'RIFX' and 'RF64' supported.")
 
     # Size of entire file
     file_size = struct.unpack(fmt, fid.read(4))[0] + 8
@@ -529,7 +749,20 @@ def _read_riff_chunk(fid):
     if str2 != b'WAVE':
         raise ValueError(f"Not a WAV file. RIFF form type is {repr(str2)}.")
 
-    return file_size, is_big_endian
+    data_size = None
+    if str1 == b'RF64':
+        if fid.read(4) != b'ds64':
+            raise ValueError("RF64 file has no ds64 chunk.")
+        size = struct.unpack('<I', fid.read(4))[0]
+        if size < 24:
+            raise ValueError("Binary structure of wave file is not compliant")
+        riff_size, data_size = struct.unpack('<QQ', fid.read(16))
+        # skip sample count and chunk size table
+        fid.seek(size - 16, 1)
+        _handle_pad_byte(fid, size)
+        file_size = riff_size + 8
+
+    return file_size, is_big_endian, data_size
 
 
 def _handle_pad_byte(fid, size):
@@ -539,6 +772,114 @@ def _handle_pad_byte(fid, size):
         fid.seek(1, 1)
 
 
+class _BufferReader:
+    """
+    Read-only file-like view over a bytes-like object.
+
+    Header reads return small ``bytes`` copies so the chunk parsers work
+    unchanged, while `read_view` hands out slices of the underlying buffer
+    so sample payloads can be decoded without copying.
+    """
+
+    def __init__(self, buf):
+        self._buf = memoryview(buf).cast('B')
+        self._pos = 0
+
+    def read(self, size=-1):
+        return bytes(self.read_view(size))
+
+    def read_view(self, size=-1):
+        start = self._pos
+        if size is None or size < 0:
+            stop = len(self._buf)
+        else:
+            stop = min(start + size, len(self._buf))
+        self._pos = stop
+        return self._buf[start:stop]
+
+    def seek(self, offset, whence=0):
+        if whence == 0:
+            self._pos = offset
+        elif whence == 1:
+            self._pos += offset
+        elif whence == 2:
+            self._pos = len(self._buf) + offset
+        else:
+            raise ValueError(f"Invalid whence ({whence})")
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def close(self):
+        pass
+
+
+def _open_source(filename):
+    """Open a path, pass through a file handle, or wrap a bytes-like."""
+    if isinstance(filename, (bytes, bytearray, memoryview)):
+        return _BufferReader(filename)
+    elif hasattr(filename, 'read'):
+        return filename
+    else:
+        return open(filename, 'rb')
+
+
+def _read_header(fid):
+    """
+    Walk the chunk list up to the first sample of the data subchunk.
+
+    Returns
+    -------
+    fmt_chunk : tuple
+        as returned by `_read_fmt_chunk`
+    is_big_endian : bool
+        whether the file is RIFX
+    size : int
+        size of data subchunk in bytes, as declared in its header
+
+    Notes
+    -----
+    Leaves the file pointer immediately after the data subchunk size.
+    """
+    file_size, is_big_endian, ds64_data_size = _read_riff_chunk(fid)
+    if is_big_endian:
+        fmt = '>I'
+    else:
+        fmt = '<I'
+
+    fmt_chunk = None
+    while fid.tell() < file_size:
+        chunk_id = fid.read(4)
+        if len(chunk_id) < 4:
+            raise ValueError("Unexpected end of file.")
+        if chunk_id == b'fmt ':
+            fmt_chunk = _read_fmt_chunk(fid, is_big_endian)
+        elif chunk_id == b'data':
+            if fmt_chunk is None:
+                raise ValueError("No fmt chunk before data")
+            size = struct.unpack(fmt, fid.read(4))[0]
+            if size == 0xFFFFFFFF and ds64_data_size is not None:
+                size = ds64_data_size
+            return fmt_chunk, is_big_endian, size
+        else:
+            _skip_unknown_chunk(fid, is_big_endian)
+    raise ValueError("No data chunk found.")
+
+
+def _decode_block(raw, dtype, format_tag, channels, bytes_per_sample,
+                  is_big_endian):
+    """Decode whole frames of raw sample bytes with `_data_dtype` rules."""
+    data = numpy.frombuffer(raw, dtype=dtype)
+    if dtype == 'V1':
+        data = _rearrange_odd_width(data, bytes_per_sample, is_big_endian)
+    elif format_tag in G711_FORMATS:
+        data = _G711_DECODE[format_tag][data]
+    if channels > 1:
+        data = data.reshape(-1, channels)
+    return data
+
+
 def read(filename, mmap=False):
     """
     Open a WAV file.
@@ -547,8 +888,9 @@ def read(filename, mmap=False):
 
     Parameters
     ----------
-    filename : string or open file handle
-        Input WAV file.
+    filename : string, open file handle or bytes-like
+        Input WAV file.  ``bytes``, ``bytearray`` and ``memoryview`` inputs
+        are decoded in place; see Returns.
     mmap : bool, optional
         Whether to read data as memory-mapped (default: False).  Not compatible
         with some bit depths; see Notes.  Only to be used on real files.
@@ -564,7 +906,10 @@ def read(filename, mmap=False):
         see Notes.  Data is 1-D for 1-channel WAV, or 2-D of shape
         (Nsamples, Nchannels) otherwise. If a file-like input without a
         C-like file descriptor (e.g., :class:`python:io.BytesIO`) is
-        passed, this will not be writeable.
+        passed, this will not be writeable.  If a bytes-like input is
+        passed, this is a view into that buffer wherever the sample layout
+        has a native numpy dtype (i.e. not 24-bit or other odd widths), and
+        is writeable only if the buffer is.
 
     Notes
     -----
@@ -597,7 +942,11 @@ def read(filename, mmap=False):
     IEEE float PCM in 32- or 64-bit format is supported, with or without mmap.
     Values exceeding [-1, +1] are not clipped.
 
-    Non-linear PCM (mu-law, A-law) is not supported.
+    Non-linear PCM (mu-law, A-law) is expanded to int16 with the G.711
+    lookup tables.  It cannot be memory-mapped.
+
+    RF64 files (EBU Tech 3306) larger than 4 GiB are supported, including
+    with mmap.
 
     References
     ----------
@@ -641,14 +990,17 @@ def read(filename, mmap=False):
     >>> plt.show()
 
     """
-    if hasattr(filename, 'read'):
+    if isinstance(filename, (bytes, bytearray, memoryview)):
+        fid = _BufferReader(filename)
+        mmap = False
+    elif hasattr(filename, 'read'):
         fid = filename
         mmap = False
     else:
         fid = open(filename, 'rb')
 
     try:
-        file_size, is_big_endian = _read_riff_chunk(fid)
+        file_size, is_big_endian, ds64_data_size = _read_riff_chunk(fid)
         fmt_chunk_received = False
         data_chunk_received = False
         while fid.tell() < file_size:
@@ -688,7 +1040,8 @@ def read(filename, mmap=False):
                 if not fmt_chunk_received:
                     raise ValueError("No fmt chunk before data")
                 data = _read_data_chunk(fid, format_tag, channels, bit_depth,
-                                        is_big_endian, block_align, mmap)
+                                        is_big_endian, block_align, mmap,
+                                        ds64_data_size)
             elif chunk_id == b'LIST':
                 # Someday this could be handled properly but for now skip it
                 _skip_unknown_chunk(fid, is_big_endian)
@@ -708,7 +1061,439 @@ def read(filename, mmap=False):
     return fs, data
 
 
-def write(filename, rate, data):
+class WavInfo(namedtuple('WavInfo', ['format_tag', 'rate', 'channels',
+                                     'bit_depth', 'block_align', 'frames',
+                                     'data_offset', 'data_size'])):
+    """
+    Header summary of a WAV file, as returned by `info`.
+
+    Attributes
+    ----------
+    format_tag : WAVE_FORMAT
+        Sample encoding, e.g. PCM or IEEE_FLOAT.
+    rate : int
+        Sample rate (in samples/sec).
+    channels : int
+        Number of channels.
+    bit_depth : int
+        Bits per sample.
+    block_align : int
+        Bytes per frame, including all channels.
+    frames : int
+        Number of frames (samples per channel) in the data subchunk.
+    data_offset : int
+        Byte offset of the first sample from the start of the file.
+    data_size : int
+        Size of the sample payload in bytes.
+    """
+    __slots__ = ()
+
+    @property
+    def seconds(self):
+        """Duration of the audio in seconds."""
+        return self.frames / self.rate
+
+
+def info(filename):
+    """
+    Read the header of a WAV file without decoding any samples.
+
+    Parameters
+    ----------
+    filename : string, open file handle or bytes-like
+        Input WAV file.
+
+    Returns
+    -------
+    info : WavInfo
+        Format, rate, channels, bit depth, frame count and location of the
+        sample payload.
+
+    Notes
+    -----
+    If the data subchunk declares more bytes than the file holds (e.g. a
+    truncated upload, or a streamed file whose header was never patched),
+    `frames` and `data_size` describe the samples actually present.
+    """
+    fid = _open_source(filename)
+    try:
+        return _probe(fid)[0]
+    finally:
+        if not hasattr(filename, 'read'):
+            fid.close()
+        else:
+            fid.seek(0)
+
+
+def _probe(fid):
+    """
+    Returns
+    -------
+    info : WavInfo
+    is_big_endian : bool
+
+    Notes
+    -----
+    Leaves the file pointer at the end of the file.
+    """
+    fmt_chunk, is_big_endian, size = _read_header(fid)
+    data_offset = fid.tell()
+    available = fid.seek(0, 2) - data_offset
+
+    format_tag, channels, fs = fmt_chunk[1:4]
+    block_align = fmt_chunk[5]
+    bit_depth = fmt_chunk[6]
+    size = min(size, available)
+    frames = size // block_align
+    return WavInfo(WAVE_FORMAT(format_tag), fs, channels, bit_depth,
+                   block_align, frames, data_offset,
+                   frames * block_align), is_big_endian
+
+
+def read_range(filename, start_frame=0, stop_frame=None, mmap=False):
+    """
+    Read a range of frames from a WAV file.
+
+    Only the header and the requested slice of the data subchunk are read;
+    the file pointer seeks straight to the first requested frame.
+
+    Parameters
+    ----------
+    filename : string, open file handle or bytes-like
+        Input WAV file.
+    start_frame : int, optional
+        First frame to read.  Negative values count from the end, so
+        ``read_range(f, -rate)`` reads the last second.
+    stop_frame : int, optional
+        Frame to stop before.  Defaults to the end of the data.  Negative
+        values count from the end.  Out-of-range values are clipped, as for
+        slices.
+    mmap : bool, optional
+        Whether to memory-map the range rather than read it (default:
+        False).  Only used for real files with 1, 2, 4 or 8 bytes per
+        sample.
+
+    Returns
+    -------
+    rate : int
+        Sample rate of WAV file.
+    data : numpy array
+        Frames ``start_frame:stop_frame`` with the same dtype and shape
+        conventions as `read`.
+    """
+    if isinstance(filename, (bytes, bytearray, memoryview)) or \
+            hasattr(filename, 'read'):
+        mmap = False
+
+    fid = _open_source(filename)
+    try:
+        info, is_big_endian = _probe(fid)
+        channels = info.channels
+        bytes_per_sample = info.block_align // channels
+        dtype = _data_dtype(info.format_tag, info.bit_depth, bytes_per_sample,
+                            is_big_endian)
+
+        start, stop, _ = slice(start_frame, stop_frame).indices(info.frames)
+        n_frames = max(stop - start, 0)
+        offset = info.data_offset + start * info.block_align
+
+        if mmap and n_frames:
+            if info.format_tag in G711_FORMATS:
+                raise ValueError("mmap=True not compatible with "
+                                 f"{info.format_tag.name} data.")
+            if bytes_per_sample not in {1, 2, 4, 8}:
+                raise ValueError("mmap=True not compatible with "
+                                 f"{bytes_per_sample}-byte container size.")
+            data = numpy.memmap(fid, dtype=dtype, mode='c', offset=offset,
+                                shape=(n_frames * channels,))
+            if channels > 1:
+                data = data.reshape(-1, channels)
+        else:
+            fid.seek(offset)
+            nbytes = n_frames * info.block_align
+            if isinstance(fid, _BufferReader):
+                raw = fid.read_view(nbytes)
+            else:
+                raw = fid.read(nbytes)
+            data = _decode_block(raw, dtype, info.format_tag, channels,
+                                 bytes_per_sample, is_big_endian)
+    finally:
+        if not hasattr(filename, 'read'):
+            fid.close()
+        else:
+            fid.seek(0)
+
+    return info.rate, data
+
+
+def read_many(sources, pad_to=None, max_workers=None):
+    """
+    Decode many 16-bit WAV files into one zero-padded array.
+
+    Parameters
+    ----------
+    sources : sequence of string, open file handle or bytes-like
+        Input WAV files.  All must be 16-bit PCM (or mu-law / A-law, which
+        decode to 16-bit) with the same sample rate and number of channels.
+    pad_to : int, optional
+        Number of frames in the output; defaults to the longest input.
+        Longer inputs are truncated.
+    max_workers : int, optional
+        If given, decode with a thread pool of this size.  Worthwhile when
+        the sources are real files, since the reads release the GIL.
+
+    Returns
+    -------
+    rate : int
+        Shared sample rate of the WAV files.
+    data : numpy array
+        int16 array of shape (Nsources, pad_to, Nchannels); frames past the
+        end of each input are zero.
+    lengths : numpy array
+        int64 array of the number of valid frames for each input.
+
+    Notes
+    -----
+    Headers are probed first (see `info`) so the output is allocated once;
+    each source is then decoded straight into its row.
+    """
+    sources = list(sources)
+    if not sources:
+        raise ValueError("No sources given.")
+
+    def decode(i):
+        _, arr = read_range(sources[i], 0, lengths[i])
+        data[i, :lengths[i]] = arr.reshape(lengths[i], channels)
+
+    if max_workers:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            infos = list(executor.map(info, sources))
+    else:
+        infos = [info(src) for src in sources]
+
+    first = infos[0]
+    rate, channels = first.rate, first.channels
+    for i, inf in enumerate(infos):
+        if not (inf.format_tag in G711_FORMATS or
+                (inf.format_tag == WAVE_FORMAT.PCM and inf.bit_depth == 16)):
+            raise ValueError(f"Source {i} is not 16-bit PCM: "
+                             f"{inf.format_tag.name}, {inf.bit_depth}-bit")
+        if (inf.rate, inf.channels) != (rate, channels):
+            raise ValueError(f"Source {i} has {inf.channels} channel(s) at "
+                             f"{inf.rate} Hz, expected {channels} at {rate} "
+                             "Hz")
+
+    lengths = numpy.array([inf.frames for inf in infos], dtype=numpy.int64)
+    if pad_to is None:
+        pad_to = int(lengths.max())
+    numpy.minimum(lengths, pad_to, out=lengths)
+    data = numpy.zeros((len(sources), pad_to, channels), dtype=numpy.int16)
+
+    if max_workers:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(decode, range(len(sources))))
+    else:
+        for i in range(len(sources)):
+            decode(i)
+
+    return rate, data, lengths
+
+
+def iter_blocks(filename, block_frames=4096):
+    """
+    Iterate over a WAV file in fixed-size blocks of frames.
+
+    The RIFF and fmt headers are parsed once up front; the samples are then
+    decoded block by block so memory use is bounded by `block_frames`
+    regardless of the length of the file.
+
+    Parameters
+    ----------
+    filename : string, open file handle or bytes-like
+        Input WAV file.  ``bytes``, ``bytearray`` and ``memoryview`` inputs
+        are decoded in place, so the blocks are views into that buffer.
+    block_frames : int, optional
+        Number of frames (samples per channel) in each block.  The last
+        block may be shorter.
+
+    Returns
+    -------
+    rate : int
+        Sample rate of WAV file.
+    blocks : generator of numpy array
+        Blocks of data with the same dtype and shape conventions as `read`.
+        The blocks are not writeable.
+
+    Notes
+    -----
+    A file opened from a path is only held open while the generator is being
+    iterated: the header is read and the file closed before returning, and the
+    file is reopened at the first block.  An open file handle passed in is
+    not closed, but is rewound to the start as in `read`, both on return and
+    once the generator is exhausted or closed.
+    """
+    if block_frames < 1:
+        raise ValueError(f"block_frames must be positive, got {block_frames}")
+
+    fid = _open_source(filename)
+    try:
+        fmt_chunk, is_big_endian, size = _read_header(fid)
+        format_tag, channels, fs = fmt_chunk[1:4]
+        block_align = fmt_chunk[5]
+        bit_depth = fmt_chunk[6]
+        bytes_per_sample = block_align // channels
+        dtype = _data_dtype(format_tag, bit_depth, bytes_per_sample,
+                            is_big_endian)
+        data_offset = fid.tell()
+    finally:
+        if hasattr(filename, 'read'):
+            fid.seek(0)
+        elif not isinstance(fid, _BufferReader):
+            fid.close()
+
+    def blocks():
+        src = fid
+        if not isinstance(fid, _BufferReader) and not hasattr(filename, 'read'):
+            src = open(filename, 'rb')
+        src.seek(data_offset)
+        remaining = size - size % block_align
+        try:
+            while remaining > 0:
+                nbytes = min(block_frames * block_align, remaining)
+                if isinstance(src, _BufferReader):
+                    raw = src.read_view(nbytes)
+                else:
+                    raw = src.read(nbytes)
+                # Truncated file: drop any partial trailing frame
+                raw = raw[:len(raw) - len(raw) % block_align]
+                if not len(raw):
+                    break
+                remaining -= len(raw)
+                yield _decode_block(raw, dtype, format_tag, channels,
+                                    bytes_per_sample, is_big_endian)
+        finally:
+            if src is not fid:
+                src.close()
+            elif hasattr(filename, 'read'):
+                src.seek(0)
+
+    return fs, blocks()
+
+
+# riff size, data size, sample count and an empty chunk size table
+_DS64_SIZE = 28
+
+
+def _check_dtype(dtype, bit_depth=None, format_tag=None):
+    """
+    Returns
+    -------
+    format_tag : WAVE_FORMAT
+        PCM or IEEE_FLOAT from the data-type, unless mu-law or A-law was
+        requested (only written from int16 data)
+    bit_depth : int
+        bits per sample to write; 24-bit is only written from int32 data
+    """
+    dkind = dtype.kind
+    if not (dkind == 'i' or dkind == 'f' or (dkind == 'u' and
+                                             dtype.itemsize == 1)):
+        raise ValueError("Unsupported data type '%s'" % dtype)
+    if format_tag is not None and format_tag not in G711_FORMATS:
+        _raise_bad_format(format_tag)
+    if format_tag is not None:
+        if not (dkind == 'i' and dtype.itemsize == 2):
+            raise ValueError(f"{WAVE_FORMAT(format_tag).name} can only be "
+                             f"written from int16 data, not '{dtype}'")
+        if bit_depth not in {None, 8}:
+            raise ValueError(f"Unsupported bit depth {bit_depth} for "
+                             f"{WAVE_FORMAT(format_tag).name}")
+        return WAVE_FORMAT(format_tag), 8
+
+    if dkind == 'f':
+        format_tag = WAVE_FORMAT.IEEE_FLOAT
+    else:
+        format_tag = WAVE_FORMAT.PCM
+    if bit_depth is None or bit_depth == dtype.itemsize * 8:
+        return format_tag, dtype.itemsize * 8
+    if bit_depth == 24 and dkind == 'i' and dtype.itemsize == 4:
+        return format_tag, bit_depth
+    raise ValueError(f"Unsupported bit depth {bit_depth} for data type "
+                     f"'{dtype}'")
+
+
+def _encode_samples(data, format_tag, bit_depth):
+    """Samples as a little-endian array ready for `_array_tofile`."""
+    if format_tag in G711_FORMATS:
+        return _G711_ENCODE[format_tag][data.astype('<i2', copy=False)
+                                        .view('<u2')]
+    if bit_depth == 24:
+        return _pack_int24(data)
+    if data.dtype.byteorder == '>' or (data.dtype.byteorder == '=' and
+                                       sys.byteorder == 'big'):
+        data = data.byteswap()
+    return data
+
+
+def _make_header(format_tag, channels, fs, n_frames, data_size, bit_depth,
+                 rf64=False, junk=False):
+    """
+    Returns
+    -------
+    header_data : bytes
+        RIFF, fmt (and for non-PCM, fact) chunks followed by the data
+        subchunk id and size, i.e. everything that precedes the samples.
+
+    Notes
+    -----
+    With `rf64`, the header is RF64 and the real sizes go in a ds64 chunk.
+    With `junk`, a JUNK chunk the size of a ds64 chunk is reserved in its
+    place so the header can later be rewritten as RF64 without moving the
+    samples.
+    """
+    # fmt chunk
+    bytes_per_second = fs*(bit_depth // 8)*channels
+    block_align = channels * (bit_depth // 8)
+
+    fmt_chunk_data = struct.pack('<HHIIHH', format_tag, channels, fs,
+                                 bytes_per_second, block_align, bit_depth)
+    if format_tag != WAVE_FORMAT.PCM:
+        # add cbSize field for non-PCM files
+        fmt_chunk_data += b'\x00\x00'
+
+    header_data = b'WAVE'
+    if rf64 or junk:
+        # placeholder; the ds64 payload needs the final RIFF size below
+        header_data += b'ds64' if rf64 else b'JUNK'
+        header_data += struct.pack('<I', _DS64_SIZE)
+        header_data += b'\x00' * _DS64_SIZE
+    header_data += b'fmt '
+    header_data += struct.pack('<I', len(fmt_chunk_data))
+    header_data += fmt_chunk_data
+
+    # fact chunk (non-PCM files)
+    if format_tag != WAVE_FORMAT.PCM:
+        header_data += b'fact'
+        header_data += struct.pack('<II', 4, n_frames & 0xFFFFFFFF)
+
+    # data chunk (needs to be immediately before the samples)
+    header_data += b'data'
+    riff_size = len(header_data) + 4 + data_size + data_size % 2
+    if not rf64:
+        header_data += struct.pack('<I', data_size & 0xFFFFFFFF)
+        return b'RIFF' + struct.pack('<I', riff_size & 0xFFFFFFFF) + header_data
+
+    header_data += struct.pack('<I', 0xFFFFFFFF)
+    ds64 = struct.pack('<QQQI', riff_size, data_size, n_frames, 0)
+    header_data = header_data[:12] + ds64 + header_data[12 + len(ds64):]
+    return b'RF64' + struct.pack('<I', 0xFFFFFFFF) + header_data
+
+
+def _needs_rf64(header_data, data_size):
+    """Whether the RIFF size of a file exceeds its 32-bit size field."""
+    return (len(header_data)-4-4) + data_size + data_size % 2 > 0xFFFFFFFF
+
+
+def write(filename, rate, data, bit_depth=None, rf64=False, format_tag=None):
     """
     Write a NumPy array as a WAV file.
 
@@ -720,6 +1505,16 @@ def write(filename, rate, data):
         The sample rate (in samples/sec).
     data : ndarray
         A 1-D or 2-D NumPy array of either integer or float data-type.
+    bit_depth : int, optional
+        Bits per sample.  Defaults to the size of the data-type.  int32 data
+        may be written as 24-bit PCM, keeping the top three bytes of each
+        sample (the inverse of how `read` returns 24-bit data).
+    rf64 : bool, optional
+        Write an RF64 header even if the data would fit in a RIFF file.  An
+        RF64 header is always used for data larger than 4 GiB.
+    format_tag : WAVE_FORMAT, optional
+        ``WAVE_FORMAT.MULAW`` or ``WAVE_FORMAT.ALAW`` to write int16 data as
+        8-bit G.711.  Defaults to PCM or IEEE float from the data-type.
 
     Notes
     -----
@@ -735,6 +1530,7 @@ def write(filename, rate, data):
     =====================  ===========  ===========  =============
     32-bit floating-point  -1.0         +1.0         float32
     32-bit PCM             -2147483648  +2147483647  int32
+    24-bit PCM             -2147483648  +2147483392  int32
     16-bit PCM             -32768       +32767       int16
     8-bit PCM              0            255          uint8
     =====================  ===========  ===========  =============
@@ -770,64 +1566,26 @@ def write(filename, rate, data):
     fs = rate
 
     try:
-        dkind = data.dtype.kind
-        if not (dkind == 'i' or dkind == 'f' or (dkind == 'u' and
-                                                 data.dtype.itemsize == 1)):
-            raise ValueError("Unsupported data type '%s'" % data.dtype)
-
-        header_data = b''
-
-        header_data += b'RIFF'
-        header_data += b'\x00\x00\x00\x00'
-        header_data += b'WAVE'
-
-        # fmt chunk
-        header_data += b'fmt '
-        if dkind == 'f':
-            format_tag = WAVE_FORMAT.IEEE_FLOAT
-        else:
-            format_tag = WAVE_FORMAT.PCM
+        format_tag, bit_depth = _check_dtype(data.dtype, bit_depth, format_tag)
         if data.ndim == 1:
             channels = 1
         else:
             channels = data.shape[1]
-        bit_depth = data.dtype.itemsize * 8
-        bytes_per_second = fs*(bit_depth // 8)*channels
-        block_align = channels * (bit_depth // 8)
-
-        fmt_chunk_data = struct.pack('<HHIIHH', format_tag, channels, fs,
-                                     bytes_per_second, block_align, bit_depth)
-        if not (dkind == 'i' or dkind == 'u'):
-            # add cbSize field for non-PCM files
-            fmt_chunk_data += b'\x00\x00'
+        data_size = data.size * (bit_depth // 8)
 
-        header_data += struct.pack('<I', len(fmt_chunk_data))
-        header_data += fmt_chunk_data
-
-        # fact chunk (non-PCM files)
-        if not (dkind == 'i' or dkind == 'u'):
-            header_data += b'fact'
-            header_data += struct.pack('<II', 4, data.shape[0])
-
-        # check data size (needs to be immediately before the data chunk)
-        if ((len(header_data)-4-4) + (4+4+data.nbytes)) > 0xFFFFFFFF:
-            raise ValueError("Data exceeds wave file size limit")
+        header_data = _make_header(format_tag, channels, fs, data.shape[0],
+                                   data_size, bit_depth)
+        if rf64 or _needs_rf64(header_data, data_size):
+            header_data = _make_header(format_tag, channels, fs,
+                                       data.shape[0], data_size, bit_depth,
+                                       rf64=True)
 
         fid.write(header_data)
 
         # data chunk
-        fid.write(b'data')
-        fid.write(struct.pack('<I', data.nbytes))
-        if data.dtype.byteorder == '>' or (data.dtype.byteorder == '=' and
-                                           sys.byteorder == 'big'):
-            data = data.byteswap()
-        _array_tofile(fid, data)
-
-        # Determine file size and place it in correct
-        #  position at start of the file.
-        size = fid.tell()
-        fid.seek(4)
-        fid.write(struct.pack('<I', size-8))
+        _array_tofile(fid, _encode_samples(data, format_tag, bit_depth))
+        if data_size % 2:
+            fid.write(b'\x00')
 
     finally:
         if not hasattr(filename, 'write'):
@@ -836,6 +1594,160 @@ def write(filename, rate, data):
             fid.seek(0)
 
 
+class WavWriter:
+    """
+    Write a WAV file incrementally.
+
+    A provisional header is written as soon as the sample format is known,
+    blocks of samples are written out as they are appended, and the RIFF,
+    fact and data sizes are patched into the header on `close`.
+
+    Parameters
+    ----------
+    filename : string or open file handle
+        Output wav file.  File handles must be seekable.
+    rate : int
+        The sample rate (in samples/sec).
+    channels : int, optional
+        Number of channels.  Inferred from the first block if not given.
+    dtype : numpy dtype, optional
+        Sample data-type, with the same rules as `write`.  Inferred from the
+        first block if not given.
+    bit_depth : int, optional
+        Bits per sample, with the same rules as `write`.
+    format_tag : WAVE_FORMAT, optional
+        mu-law or A-law encoding, with the same rules as `write`.
+    rf64 : {False, True, 'auto'}, optional
+        False (default) writes a RIFF file, limited to 4 GiB.  True always
+        writes an RF64 file.  'auto' reserves room for a ds64 chunk in a
+        JUNK chunk and only switches the header to RF64 on `close` if the
+        data outgrew 4 GiB; use it when the final length is unknown.
+
+    Examples
+    --------
+    >>> with WavWriter("example.wav", 24000) as writer:
+    ...     for af in frames:
+    ...         writer.append(af)
+
+    """
+
+    def __init__(self, filename, rate, channels=None, dtype=None,
+                 bit_depth=None, format_tag=None, rf64=False):
+        if rf64 not in {False, True, 'auto'}:
+            raise ValueError(f"rf64 must be False, True or 'auto', not {rf64!r}")
+        if hasattr(filename, 'write'):
+            self._fid = filename
+        else:
+            self._fid = open(filename, 'wb')
+        self._filename = filename
+        self.rate = rate
+        self.channels = channels
+        self.dtype = None if dtype is None else numpy.dtype(dtype)
+        self.bit_depth = bit_depth
+        self.format_tag = format_tag
+        self.rf64 = rf64
+        self.frames = 0
+        self._data_size = 0
+        self._start = None
+        self.closed = False
+        if self.channels is not None and self.dtype is not None:
+            self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_header(self):
+        self.format_tag, self.bit_depth = _check_dtype(
+            self.dtype, self.bit_depth, self.format_tag)
+        self._start = self._fid.tell()
+        self._fid.write(self._header(self.rf64 is True))
+
+    def _header(self, rf64):
+        return _make_header(self.format_tag, self.channels, self.rate,
+                            self.frames, self._data_size, self.bit_depth,
+                            rf64=rf64, junk=self.rf64 == 'auto')
+
+    def append(self, data):
+        """
+        Append a block of samples.
+
+        Parameters
+        ----------
+        data : ndarray, av.AudioFrame or AudioClip
+            A 1-D or 2-D array of shape (Nsamples, Nchannels), an
+            AudioFrame whose samples are converted with ``to_ndarray``, or
+            an AudioClip, whose ``data`` array is written as is.
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed WavWriter.")
+        if hasattr(data, 'to_ndarray'):
+            data = _frame_to_ndarray(data)
+        elif isinstance(getattr(data, 'data', None), numpy.ndarray):
+            data = data.data
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+        if self.channels is None:
+            self.channels = data.shape[1]
+        if self.dtype is None:
+            self.dtype = data.dtype
+        if self._start is None:
+            self._write_header()
+
+        if data.shape[1] != self.channels:
+            raise ValueError(f"Expected {self.channels} channels, got "
+                             f"{data.shape[1]}")
+        if (data.dtype.kind, data.dtype.itemsize) != (self.dtype.kind,
+                                                      self.dtype.itemsize):
+            raise ValueError(f"Expected samples of type '{self.dtype}', got "
+                             f"'{data.dtype}'")
+        self.frames += data.shape[0]
+        self._data_size += data.size * (self.bit_depth // 8)
+        _array_tofile(self._fid, _encode_samples(data, self.format_tag,
+                                                 self.bit_depth))
+
+    def close(self):
+        """Patch the header sizes and close the file if we opened it."""
+        if self.closed:
+            return
+        try:
+            if self._start is None:
+                # Nothing appended; write an empty 16-bit mono file
+                if self.channels is None:
+                    self.channels = 1
+                if self.dtype is None:
+                    self.dtype = numpy.dtype('<i2')
+                self._write_header()
+            if self._data_size % 2:
+                self._fid.write(b'\x00')
+            header_data = self._header(self.rf64 is True)
+            if _needs_rf64(header_data, self._data_size):
+                if self.rf64 is False:
+                    raise ValueError("Data exceeds wave file size limit; "
+                                     "use rf64=True or rf64='auto'")
+                header_data = self._header(True)
+            end = self._fid.tell()
+            self._fid.seek(self._start)
+            self._fid.write(header_data)
+            self._fid.seek(end)
+        finally:
+            self.closed = True
+            if not hasattr(self._filename, 'write'):
+                self._fid.close()
+            else:
+                self._fid.seek(0)
+
+
+def _frame_to_ndarray(af):
+    """Samples of an av.AudioFrame as an array of shape (Nsamples, Nchannels)."""
+    arr = af.to_ndarray()
+    if af.format.is_planar:
+        return arr.T
+    return arr.reshape(-1, len(af.layout.channels))
+
+
 def _array_tofile(fid, data):
     # ravel gives a c-contiguous buffer
     fid.write(data.ravel().view('b').data)
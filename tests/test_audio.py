@@ -1,6 +1,11 @@
+from fractions import Fraction
+import io
+
 import av
+import numpy as np
+import pytest
 
-from moshiaud import audio
+from moshiaud import audio, wavfile
 
 def write_audio_frame_to_wav(frame: av.AudioFrame, output_file):
     # Source: https://stackoverflow.com/a/56307655/5298555
@@ -19,4 +24,369 @@ def test_wav(wavbytes):
 
 def test_seconds(wavbytes):
     af = audio.wav2af(wavbytes)
-    assert 0.5 < audio.seconds(af) < 1.5, "Saying 'hello' should take ~1 second"
\ No newline at end of file
+    assert 0.5 < audio.seconds(af) < 1.5, "Saying 'hello' should take ~1 second"
+
+def test_wav2af_path(data_dir, wavbytes):
+    af = audio.wav2af(data_dir / "hello.wav")
+    assert af.samples == audio.wav2af(wavbytes).samples
+
+def test_energy_profile(wavbytes):
+    af = audio.wav2af(wavbytes)
+    arr = af.to_ndarray().reshape(-1, 2).astype(np.float64)
+    window, hop = round(af.rate * 0.02), round(af.rate * 0.01)
+    profile = audio.energy_profile(af, window_ms=20, hop_ms=10)
+    assert len(profile) == (len(arr) - window) // hop + 1
+    expected = [np.sqrt(np.mean(arr[i:i+window] ** 2)) for i in range(0, len(arr) - window + 1, hop)]
+    np.testing.assert_allclose(profile, expected)
+    assert np.isclose(profile.max(), max(expected))
+    assert audio.energy(af) == pytest.approx(np.sqrt(np.mean(arr ** 2)))
+
+def test_energy_profile_dbfs():
+    arr = np.full((1, 4800), 16384, dtype=np.int16)
+    arr[:, :2400] = 0
+    af = av.AudioFrame.from_ndarray(arr, format="s16", layout="mono")
+    af.rate = 48000
+    db = audio.energy_profile(af, window_ms=10, hop_ms=10, dbfs=True)
+    assert len(db) == 10
+    assert np.all(np.isneginf(db[:5]))
+    np.testing.assert_allclose(db[5:], 20 * np.log10(0.5))
+
+@pytest.mark.parametrize("format,value", [("flt", 0.5), ("fltp", 0.5), ("s32", 2**30), ("u8", 192)])
+def test_energy_profile_dbfs_follows_format(format, value):
+    dtype = audio._WAV_DTYPES[av.AudioFormat(format).packed.name]
+    af = av.AudioFrame.from_ndarray(np.full((1, 4800), value, dtype=dtype), format=format, layout="mono")
+    af.rate = 48000
+    db = audio.energy_profile(af, window_ms=10, hop_ms=10, dbfs=True)
+    np.testing.assert_allclose(db, 20 * np.log10(0.5))
+    assert not audio.is_silent(af)
+
+def _frame(arr: np.ndarray, rate: int = 16000) -> av.AudioFrame:
+    af = av.AudioFrame.from_ndarray(arr.reshape(1, -1), format="s16", layout="mono")
+    af.rate = rate
+    return af
+
+def test_trim_silence():
+    arr = np.zeros(16000, dtype=np.int16)
+    arr[8000:9600] = 10000  # 100ms of sound in the middle of a second of silence
+    af = _frame(arr)
+    assert not audio.is_silent(af)
+    trimmed = audio.trim_silence(af, pad_ms=50)
+    assert trimmed.rate == af.rate and trimmed.layout.name == "mono"
+    assert trimmed.samples == 1600 + 2 * 800
+    assert audio.energy(trimmed) > audio.energy(af)
+
+def test_is_silent():
+    af = _frame(np.random.default_rng(0).integers(-30, 30, 16000, dtype=np.int16))
+    assert audio.is_silent(af)
+    with pytest.raises(ValueError):
+        audio.trim_silence(af)
+
+def test_short_clip_is_not_silent_and_not_trimmed():
+    af = _frame(np.full(200, 10000, dtype=np.int16))  # 12.5ms, shorter than one window
+    assert not audio.is_silent(af)
+    assert audio.trim_silence(af) is af
+    assert audio.is_silent(_frame(np.zeros(200, dtype=np.int16)))
+
+def test_sound_in_trailing_partial_window():
+    arr = np.zeros(16300, dtype=np.int16)
+    arr[16000:] = 10000  # 300 samples of sound after a second of silence
+    af = _frame(arr)
+    assert not audio.is_silent(af)
+    trimmed = audio.trim_silence(af, pad_ms=0)
+    assert trimmed.samples == 320  # the last window ends at the last sample
+    assert audio._af_ndarray(trimmed)[-300:].min() == 10000
+
+def test_trim_silence_keeps_speech(wavbytes):
+    af = audio.wav2af(wavbytes)
+    trimmed = audio.trim_silence(af)
+    assert 0 < trimmed.samples <= af.samples
+    assert not audio.is_silent(trimmed)
+
+def test_wav2af_sources_agree(data_dir, wavbytes):
+    expected = audio.wav2af(wavbytes).to_ndarray()
+    for wav in (io.BytesIO(wavbytes), data_dir / "hello.wav"):
+        np.testing.assert_array_equal(audio.wav2af(wav).to_ndarray(), expected)
+
+@pytest.mark.parametrize("dtype,bit_depth,scale", [(np.int32, 24, 1 << 16), (np.int32, None, 1 << 16), (np.float32, None, 1 / 32767)])
+def test_wav2af_converts_to_s16(tmp_path, dtype, bit_depth, scale):
+    s16 = np.arange(-32000, 32000, 640, dtype=np.int16)
+    wav = tmp_path / "wide.wav"
+    wavfile.write(wav, 16000, (s16.astype(np.float64) * scale).astype(dtype), bit_depth=bit_depth)
+    af = audio.wav2af(wav)
+    assert af.format.name == "s16" and af.rate == 16000
+    np.testing.assert_allclose(af.to_ndarray().ravel(), s16, atol=1)
+
+def test_af2wav(wavbytes):
+    af = audio.wav2af(wavbytes)
+    wav = audio.af2wav(af)
+    info = wavfile.info(wav)
+    assert (info.rate, info.channels, info.bit_depth) == (24000, 2, 16)
+    assert abs(info.seconds - audio.seconds(af)) < 0.01
+    wav = audio.af2wav(af, layout="mono", rate=16000)
+    info = wavfile.info(wav)
+    assert (info.rate, info.channels) == (16000, 1)
+
+def test_af2wav_passthrough(wavbytes):
+    af = audio.wav2af(wavbytes)
+    wav = audio.af2wav(af, layout="stereo", rate=af.rate)
+    np.testing.assert_array_equal(wavfile.read(wav)[1], wavfile.read(wavbytes)[1])
+
+def test_af2wav_s16_skips_av_resampler(wavbytes, monkeypatch):
+    def no_resampler(*args, **kwargs):
+        raise AssertionError("af2wav built an av.AudioResampler")
+    monkeypatch.setattr(av, "AudioResampler", no_resampler)
+    stereo = wavfile.read(wavbytes)[1]
+    mono = audio.af2wav(audio.wav2af(wavbytes), layout="mono", rate=44100)
+    np.testing.assert_array_equal(wavfile.read(mono)[1], (stereo.astype(np.int32).sum(axis=1) // 2).astype(np.int16))
+    # NOTE a synthesized reply: mono 24kHz to the default stereo 24kHz duplicates the channel
+    af = audio.wav2af(mono)
+    af.rate = 24000
+    rate, data = wavfile.read(audio.af2wav(af))
+    assert rate == 24000
+    np.testing.assert_array_equal(data[:, 0], data[:, 1])
+    np.testing.assert_array_equal(data[:, 0], wavfile.read(mono)[1])
+    info = wavfile.info(audio.af2wav(af, rate=16000))
+    assert (info.rate, info.channels, info.frames) == (16000, 2, -(-af.samples * 2 // 3))
+
+def test_audio_converter_reuses_resampler(wavbytes):
+    af = audio.wav2af(wavbytes)
+    converter = audio.AudioConverter(layout="mono", rate=16000)
+    frames = converter.convert(af) + converter.convert(af)
+    assert len(converter._resamplers) == 1
+    frames += converter.flush()
+    assert sum(f.samples for f in frames) == pytest.approx(2 * af.samples * 16000 / af.rate, abs=2)
+    assert all(f.rate == 16000 and f.layout.name == "mono" for f in frames)
+
+@pytest.mark.parametrize("src_rate,dst_rate", [(48000, 16000), (24000, 16000), (16000, 24000), (44100, 16000)])
+def test_resample_sine(src_rate, dst_rate):
+    tone = lambda rate, n: 0.5 * np.sin(2 * np.pi * 440 * np.arange(n) / rate)
+    x = tone(src_rate, src_rate).astype(np.float32)
+    y = audio.resample(x, src_rate, dst_rate)
+    assert y.dtype == np.float32 and len(y) == dst_rate
+    np.testing.assert_allclose(y[200:-200], tone(dst_rate, dst_rate)[200:-200], atol=1e-3)
+
+def test_resample_removes_aliases():
+    x = np.sin(2 * np.pi * 10000 * np.arange(48000) / 48000).astype(np.float32)
+    y = audio.resample(x, 48000, 16000)  # 10kHz is above the 8kHz Nyquist frequency
+    assert np.sqrt(np.mean(y[200:-200] ** 2)) < 1e-3
+
+def test_resample_int16_frame(wavbytes):
+    af = audio.wav2af(wavbytes)
+    out = audio.resample(af, None, 16000)
+    assert (out.rate, out.format.name, out.layout.name) == (16000, "s16", "stereo")
+    assert out.samples == -(-af.samples * 16000 // af.rate)
+    assert audio.energy(out) == pytest.approx(audio.energy(af), rel=0.05)
+    arr = af.to_ndarray().reshape(-1, 2)
+    assert audio.resample(arr, af.rate, af.rate) is arr
+
+@pytest.mark.parametrize("shape", [(0,), (0, 2)])
+def test_resample_empty(shape):
+    out = audio.resample(np.zeros(shape, dtype=np.int16), 48000, 16000)
+    assert out.shape == shape and out.dtype == np.int16
+    clip = audio.AudioClip(np.zeros((0, 1), dtype=np.int16), 48000)
+    assert audio.resample(clip, None, 16000).samples == 0
+    assert wavfile.read(audio.af2wav(clip, layout="mono", rate=16000).getvalue())[1].size == 0
+
+@pytest.mark.parametrize("codec,magic", [("flac", b"fLaC"), ("pcm_s16le", b"RIFF")])
+def test_encode(wavbytes, codec, magic):
+    af = audio.wav2af(wavbytes)
+    enc = audio.encode(af, codec=codec)
+    assert enc[:4] == magic
+    with av.open(io.BytesIO(enc)) as container:
+        frames = list(container.decode(audio=0))
+    assert (frames[0].rate, len(frames[0].layout.channels)) == (af.rate, len(af.layout.channels))
+    decoded = np.concatenate([f.to_ndarray() for f in frames], axis=1)
+    np.testing.assert_array_equal(decoded, af.to_ndarray())
+
+def test_af2flac_is_smaller_than_wav(wavbytes):
+    af = audio.wav2af(wavbytes)
+    assert len(audio.af2flac(af)) < audio.af2wav(af, rate=af.rate).getbuffer().nbytes // 2
+
+def test_encode_rejects_unknown_codec(wavbytes):
+    with pytest.raises(ValueError):
+        audio.encode(audio.wav2af(wavbytes), codec="nope")
+
+@pytest.mark.parametrize("name", ["hello.m4a", "hello_mono.flac", "hello.wav"])
+def test_decode(data_dir, name):
+    path = data_dir / name
+    frames = list(audio.decode(path))
+    assert frames and all(isinstance(f, av.AudioFrame) for f in frames)
+    assert len({(f.format.name, f.layout.name, f.rate) for f in frames}) == 1
+    # bytes are decoded in memory, to the same frames
+    assert sum(f.samples for f in audio.decode(path.read_bytes())) == sum(f.samples for f in frames)
+
+def test_decode_is_lazy():
+    frames = audio.decode(b"not audio")  # nothing is read until the first frame is requested
+    with pytest.raises(av.error.InvalidDataError):
+        next(frames)
+
+def test_decode_converts(m4abytes):
+    frames = list(audio.decode(m4abytes, format="s16", layout="mono", rate=16000))
+    assert all((f.format.name, f.layout.name, f.rate) == ("s16", "mono", 16000) for f in frames)
+
+def test_decode_ndarray(data_dir):
+    rate, arr = audio.decode_ndarray(data_dir / "hello.wav")
+    rate_, expected = wavfile.read(data_dir / "hello.wav")
+    assert rate == rate_
+    np.testing.assert_array_equal(arr, expected)
+    rate, arr = audio.decode_ndarray(data_dir / "hello.m4a")
+    assert arr.dtype == np.int16 and arr.ndim == 2 and len(arr) / rate == pytest.approx(1, abs=1)
+
+def test_ring_buffer_keeps_latest_samples():
+    ring = audio.AudioRingBuffer(seconds=1, rate=100, channels=2)
+    arr = np.arange(2 * 250, dtype=np.int16).reshape(-1, 2)
+    for i in range(0, len(arr), 30):  # blocks straddle the wrap point
+        ring.append(arr[i:i+30])
+    assert len(ring) == 100 and ring.seconds == 1
+    np.testing.assert_array_equal(ring.latest(), arr[-100:])
+    np.testing.assert_array_equal(ring.latest(0.25), arr[-25:])
+    assert np.shares_memory(ring.latest(), ring._buf)
+    ring.append(arr)  # longer than the buffer
+    np.testing.assert_array_equal(ring.latest(), arr[-100:])
+
+def test_ring_buffer_partially_filled():
+    ring = audio.AudioRingBuffer(seconds=1, rate=100, channels=1)
+    ring.append(np.arange(10, dtype=np.int16))
+    assert len(ring) == 10
+    np.testing.assert_array_equal(ring.latest(0.05).ravel(), np.arange(5, 10))
+    np.testing.assert_array_equal(ring.latest(1).ravel(), np.arange(10))
+
+def test_ring_buffer_audio_frames(wavbytes):
+    af = audio.wav2af(wavbytes)
+    ring = audio.AudioRingBuffer(seconds=0.5, rate=af.rate)
+    ring.append(af)
+    expected = audio._af_ndarray(af)[-ring.capacity:]
+    np.testing.assert_array_equal(audio._af_ndarray(ring.to_af()), expected)
+    np.testing.assert_array_equal(wavfile.read(ring.to_wav())[1], expected)
+    fltp = audio.AudioConverter(format="fltp", layout="stereo", rate=af.rate).convert(af)[0]
+    ring.append(fltp)
+    assert np.abs(ring.latest().astype(np.int32) - expected).max() <= 1
+    with pytest.raises(ValueError):
+        ring.append(audio.resample(af, None, 16000))
+
+@pytest.mark.parametrize("format", ["s16", "fltp"])
+def test_split_concat_round_trip(wavbytes, format):
+    af = audio.wav2af(wavbytes)
+    af = audio.AudioConverter(format=format, layout="stereo", rate=af.rate).convert(af)[0]
+    frames = audio.split(af, frame_ms=20)
+    size = round(af.rate * 0.02)
+    assert all(f.samples == size for f in frames[:-1]) and 0 < frames[-1].samples <= size
+    assert [f.pts for f in frames] == list(range(0, af.samples, size))
+    assert all(f.time_base == Fraction(1, af.rate) and f.rate == af.rate for f in frames)
+    joined = audio.concat(frames)
+    assert (joined.format.name, joined.layout.name, joined.samples, joined.pts) == (format, "stereo", af.samples, 0)
+    np.testing.assert_array_equal(joined.to_ndarray(), af.to_ndarray())
+
+def test_split_pad(wavbytes):
+    af = audio.wav2af(wavbytes)
+    frames = audio.split(af, frame_ms=20, pad=True)
+    size = round(af.rate * 0.02)
+    assert all(f.samples == size for f in frames)
+    tail = audio._af_ndarray(frames[-1])[af.samples % size:]
+    assert not tail.any()
+
+def test_split_pts_without_time_base(wavbytes):
+    af = audio.wav2af(wavbytes)
+    af.pts = 100
+    assert af.time_base is None
+    frames = audio.split(af, frame_ms=20)
+    size = round(af.rate * 0.02)
+    assert [f.pts for f in frames[:2]] == [100, 100 + size]
+    assert audio.split(audio.concat([af]), frame_ms=20)[0].pts == 100
+
+def test_concat_rejects_mixed_frames(wavbytes):
+    af = audio.wav2af(wavbytes)
+    with pytest.raises(ValueError):
+        audio.concat([af, audio.resample(af, None, 16000)])
+
+def test_content_hash_ignores_header_chunks(wavbytes):
+    rate, data = wavfile.read(wavbytes)
+    rf64 = io.BytesIO()
+    wavfile.write(rf64, rate, data, rf64=True)
+    assert rf64.getvalue() != wavbytes
+    digest = audio.content_hash(wavbytes)
+    assert len(digest) == 32
+    assert audio.content_hash(rf64) == digest
+    assert audio.content_hash(wavbytes, block_frames=100) == digest
+    assert audio.content_hash(audio.wav2af(wavbytes)) == digest
+
+def test_content_hash_differs(data_dir, wavbytes):
+    rate, data = wavfile.read(wavbytes)
+    other = io.BytesIO()
+    wavfile.write(other, rate + 1, data)
+    digests = {audio.content_hash(wavbytes), audio.content_hash(other), audio.content_hash(data_dir / "hello_mono.wav")}
+    assert len(digests) == 3
+
+def test_audio_clip_round_trip(wavbytes):
+    af = audio.wav2af(wavbytes)
+    clip = audio.AudioClip.from_af(af)
+    assert (clip.samples, clip.rate, clip.layout.name) == (af.samples, af.rate, af.layout.name)
+    assert np.shares_memory(clip.data, np.frombuffer(af.planes[0], dtype=np.int16))
+    af_ = clip.to_af()
+    assert (af_.format.name, af_.layout.name, af_.rate) == ("s16", "stereo", af.rate)
+    np.testing.assert_array_equal(af_.to_ndarray(), af.to_ndarray())
+
+def test_wav2clip_is_a_view(wavbytes):
+    clip = audio.wav2clip(wavbytes)
+    assert clip.data.dtype == np.int16 and clip.layout.name == "stereo"
+    assert np.shares_memory(clip.data, np.frombuffer(wavbytes, dtype=np.uint8))
+    np.testing.assert_array_equal(clip.data, wavfile.read(wavbytes)[1])
+
+def test_wav2clip_is_read_only_and_does_not_pin_bytesio(wavbytes, data_dir):
+    buf = io.BytesIO(wavbytes)
+    clip = audio.wav2clip(buf)
+    before = clip.data.copy()
+    buf.seek(0, io.SEEK_END)
+    buf.write(b"\x00" * 1024)  # NOTE raises BufferError if the clip exports the buffer
+    buf.getbuffer()[44:1068] = b"\x01" * 1024
+    np.testing.assert_array_equal(clip.data, before)
+    assert not clip.data.flags.writeable
+    assert not audio.wav2clip(data_dir / "hello_mono.wav").data.flags.writeable
+
+def test_audio_clip_numeric_functions(wavbytes):
+    af = audio.wav2af(wavbytes)
+    clip = audio.wav2clip(wavbytes)
+    assert audio.seconds(clip) == audio.seconds(af)
+    assert audio.energy(clip) == audio.energy(af)
+    np.testing.assert_array_equal(audio.energy_profile(clip), audio.energy_profile(af))
+    assert audio.is_silent(clip) == audio.is_silent(af)
+    trimmed = audio.trim_silence(clip)
+    assert isinstance(trimmed, audio.AudioClip)
+    np.testing.assert_array_equal(trimmed.data, audio._af_ndarray(audio.trim_silence(af)))
+    assert audio.content_hash(clip) == audio.content_hash(af)
+
+def test_audio_clip_frame_functions(wavbytes):
+    af = audio.wav2af(wavbytes)
+    clip = audio.wav2clip(wavbytes)
+    resampled = audio.resample(clip, None, 16000)
+    assert isinstance(resampled, audio.AudioClip) and resampled.rate == 16000
+    np.testing.assert_array_equal(resampled.data, audio._af_ndarray(audio.resample(af, None, 16000)))
+    chunks = audio.split(clip, 20, pad=True)
+    assert all(isinstance(chunk, audio.AudioClip) for chunk in chunks)
+    assert [chunk.samples for chunk in chunks] == [frame.samples for frame in audio.split(af, 20, pad=True)]
+    assert np.shares_memory(chunks[0].data, clip.data)
+    joined = audio.concat(audio.split(clip, 20))
+    np.testing.assert_array_equal(joined.data, clip.data)
+    assert audio.af2wav(clip, rate=16000).getvalue() == audio.af2wav(af, rate=16000).getvalue()
+    assert audio.af2wav(clip, format="flt").getvalue() == audio.af2wav(af, format="flt").getvalue()
+    np.testing.assert_array_equal(audio.decode_ndarray(audio.af2flac(clip))[1], clip.data)
+    buffer = audio.AudioRingBuffer(1, rate=clip.rate, channels=2)
+    buffer.append(clip)
+    np.testing.assert_array_equal(buffer.latest(1), clip.data[-clip.rate:])
+    out = io.BytesIO()
+    with wavfile.WavWriter(out, clip.rate, channels=2) as writer:
+        writer.append(clip)
+    np.testing.assert_array_equal(wavfile.read(out.getvalue())[1], clip.data)
+
+def test_float_clip_is_scaled_to_full_scale():
+    t = np.arange(16000) / 16000
+    clip = audio.AudioClip((0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)[:, None], 16000)
+    assert not audio.is_silent(clip)
+    # NOTE a sine at half full scale has an RMS of 0.5 / sqrt(2), i.e. about -9 dBFS
+    np.testing.assert_allclose(audio.energy_profile(clip, dbfs=True), 20 * np.log10(0.5 / np.sqrt(2)), atol=0.1)
+    quiet = audio.AudioClip(np.full((16000, 1), 1e-4, dtype=np.float32), 16000)
+    assert audio.is_silent(quiet)
+
+def test_audio_clip_rejects_mismatched_layout():
+    with pytest.raises(ValueError):
+        audio.AudioClip(np.zeros((10, 2), dtype=np.int16), 16000, layout="mono")
@@ -0,0 +1,99 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import time
+
+import pytest
+
+from moshiaud.cache import BytesCache, SingleFlight, make_key
+
+def test_make_key():
+    assert make_key("Hello", "en-US-Standard-A", 24000) == make_key("Hello", "en-US-Standard-A", 24000)
+    assert make_key("ab", "c") != make_key("a", "bc")
+    assert make_key("Hello", 24000) != make_key("Hello", 16000)
+
+def test_lru_evicts_by_size():
+    cache = BytesCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"5678")
+    assert cache.get("a") == b"1234"  # now b is least recently used
+    cache.put("c", b"90")
+    cache.put("d", b"xy")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234" and cache.get("c") == b"90" and cache.get("d") == b"xy"
+    assert cache.nbytes == 8
+    cache.put("big", b"x" * 11)  # too big to keep in memory
+    assert cache.get("big") is None and len(cache) == 3
+    assert cache.stats == dict(memory_hits=4, disk_hits=0, misses=2, entries=3, nbytes=8)
+
+def test_disk_tier(tmp_path: Path):
+    cache = BytesCache(max_bytes=100, directory=tmp_path, ttl=60)
+    cache.put("k", b"audio")
+    fresh = BytesCache(max_bytes=100, directory=tmp_path, ttl=60)
+    assert fresh.get("k") == b"audio"
+    assert fresh.get("k") == b"audio"
+    assert (fresh.disk_hits, fresh.memory_hits, fresh.misses) == (1, 1, 0)
+
+def test_disk_tier_expires(tmp_path: Path):
+    BytesCache(directory=tmp_path).put("k", b"audio")
+    path = tmp_path / "k" / "k"  # NOTE entries are sharded by the first two characters of the key
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    cache = BytesCache(directory=tmp_path, ttl=60)
+    assert cache.get("k") is None and cache.misses == 1
+    assert not path.exists()
+
+def test_put_sweeps_expired_entries(tmp_path: Path):
+    cache = BytesCache(directory=tmp_path, ttl=60, sweep_interval=3600)
+    cache.put("old", b"audio")
+    path = tmp_path / "ol" / "old"
+    old = time.time() - 120
+    os.utime(path, (old, old))
+    cache.put("new", b"audio")
+    assert path.exists()  # NOTE swept at most every sweep_interval
+    cache.sweep_interval = 0
+    cache.put("new", b"audio")
+    assert not path.exists() and (tmp_path / "ne" / "new").exists()
+    assert cache.get("old") == b"audio"  # NOTE still in memory
+
+def test_single_flight_threads():
+    flight = SingleFlight()
+    calls = []
+    def slow(x):
+        calls.append(x)
+        time.sleep(0.1)
+        return x * 2
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(lambda _: flight.do("k", slow, 21), range(10)))
+    assert results == [42] * 10
+    assert calls == [21] and (flight.calls, flight.shared) == (1, 9)
+    assert flight.do("k", slow, 1) == 2  # finished calls aren't remembered
+
+def test_single_flight_shares_exceptions():
+    flight = SingleFlight()
+    def fail():
+        time.sleep(0.1)
+        raise RuntimeError("quota")
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(flight.do, "k", fail) for _ in range(4)]
+    for future in futures:
+        with pytest.raises(RuntimeError):
+            future.result()
+    assert flight.calls == 1
+
+def test_single_flight_async():
+    flight = SingleFlight()
+    calls = []
+    async def slow(x):
+        calls.append(x)
+        await asyncio.sleep(0.05)
+        return x * 2
+    async def main():
+        first = asyncio.ensure_future(flight.do_async("k", slow, 21))
+        others = asyncio.gather(*[flight.do_async("k", slow, 21) for _ in range(5)], flight.do_async("j", slow, 1))
+        await asyncio.sleep(0)
+        first.cancel()  # NOTE the shared call carries on for the others
+        return await others
+    assert asyncio.run(main()) == [42] * 5 + [2]
+    assert sorted(calls) == [1, 21] and flight.shared == 5
@@ -1,10 +1,19 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import io
 import os
+import threading
+import time
+from types import SimpleNamespace
 
+from google.api_core.exceptions import ResourceExhausted
 from google.cloud.firestore import Client
 from google.cloud import texttospeech as tts
+import numpy as np
 import pytest
 
-from moshiaud import audio, synthesize
+from moshiaud import audio, synthesize, wavfile
+from moshiaud.cache import BytesCache, SingleFlight
 from moshiaud.voice import Voice
 
 @pytest.fixture(params=["en-US-Standard-A", "yue-HK-Standard-A"])
@@ -18,4 +27,191 @@ def test_synthesize(db: Client):
     voc = Voice.get_voice("en-US", db)
     af = synthesize.synthesize(msg, voc)
     assert af.rate == 24000
-    print(f"Test wav length: {audio.seconds(af)}")
\ No newline at end of file
+    print(f"Test wav length: {audio.seconds(af)}")
+
+@pytest.mark.gcp
+def test_synthesize_clip(db: Client):
+    voc = Voice.get_voice("en-US", db)
+    clip = synthesize.synthesize("Hello", voc, to="clip")
+    assert isinstance(clip, audio.AudioClip)
+    assert clip.rate == 24000 and clip.data.dtype == "int16"
+
+@pytest.mark.gcp
+def test_synthesize_async(db: Client):
+    voc = Voice.get_voice("en-US", db)
+    async def both():
+        return await asyncio.gather(
+            synthesize.synthesize_async("Hello", voc),
+            synthesize.synthesize_async("Hello", voc, to="bytes", use_cache=False),
+        )
+    af, wav = asyncio.run(both())
+    assert af.rate == 24000
+    assert wav[:4] == b"RIFF"
+
+@pytest.mark.gcp
+def test_synthesize_async_on_successive_loops(db: Client):
+    voc = Voice.get_voice("en-US", db)
+    for _ in range(2):
+        wav = asyncio.run(synthesize.synthesize_async("Hello", voc, to="bytes", use_cache=False))
+        assert wav[:4] == b"RIFF"
+
+def test_sentences():
+    assert synthesize._sentences("Hello there! How are you? Fine; thanks. 你好。我很好！") == [
+        "Hello there!", "How are you?", "Fine;", "thanks.", "你好。", "我很好！"]
+    assert synthesize._sentences("  ") == []
+
+@pytest.mark.gcp
+def test_synthesize_stream(db: Client):
+    voc = Voice.get_voice("en-US", db)
+    frames = list(synthesize.synthesize_stream("Hello. How are you? I am fine.", voc, max_concurrency=2))
+    assert len(frames) == 3
+    assert all(af.rate == 24000 for af in frames)
+
+def test_token_bucket_limits_rate():
+    bucket = synthesize._TokenBucket(qps=100, burst=1)
+    start = time.monotonic()
+    for _ in range(21):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.19
+
+@pytest.mark.gcp
+def test_synthesize_many(db: Client):
+    voc = Voice.get_voice("en-US", db)
+    texts = ["Hello.", "Goodbye.", "Hello."]
+    wavs = synthesize.synthesize_many(texts, voc, to="bytes", max_concurrency=2, qps=5)
+    assert len(wavs) == 3 and wavs[0] == wavs[2] and wavs[0] != wavs[1]
+
+def _wav(text: str) -> bytes:
+    """A distinct, valid wav per text, so results can be told apart."""
+    wav = io.BytesIO()
+    wavfile.write(wav, 24000, np.full(240 * len(text), len(text), dtype=np.int16))
+    return wav.getvalue()
+
+def _wait_for(condition, timeout: float = 2):
+    """Poll without time.sleep, which the fake_api fixture replaces."""
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        threading.Event().wait(0.005)
+
+class FakeClient:
+    """Stands in for the text-to-speech client: records requests, and fails texts in `failures` that many times."""
+    def __init__(self):
+        self.texts = []
+        self.failures = {}
+        self.before = {}  # NOTE text -> callable run before answering, e.g. to hold a reply back
+        self._lock = threading.Lock()
+
+    def _answer(self, request: dict):
+        text = request["input"].text
+        with self._lock:
+            self.texts.append(text)
+            fail = self.failures.get(text, 0) > 0
+            if fail:
+                self.failures[text] -= 1
+        if fail:
+            raise ResourceExhausted("quota")
+        return SimpleNamespace(audio_content=_wav(text))
+
+    def synthesize_speech(self, request: dict, timeout: float):
+        if request["input"].text in self.before:
+            self.before[request["input"].text]()
+        return self._answer(request)
+
+class FakeAsyncClient(FakeClient):
+    async def synthesize_speech(self, request: dict, timeout: float):
+        if request["input"].text in self.before:
+            await self.before[request["input"].text]()
+        return self._answer(request)
+
+@pytest.fixture
+def fake_api(monkeypatch) -> FakeClient:
+    """Replace the API, cache, coalescing and sleeps in synthesize with fresh fakes; sleeps are recorded, not slept."""
+    fake = FakeClient()
+    fake.async_client = FakeAsyncClient()
+    fake.async_client.texts = fake.texts
+    fake.sleeps = []
+    monkeypatch.setattr(synthesize, "client", fake)
+    monkeypatch.setattr(synthesize.tts, "TextToSpeechAsyncClient", lambda: fake.async_client)
+    monkeypatch.setattr(synthesize, "cache", BytesCache())
+    monkeypatch.setattr(synthesize, "inflight", SingleFlight())
+    monkeypatch.setattr(synthesize.time, "sleep", fake.sleeps.append)
+    monkeypatch.setattr(synthesize.random, "random", lambda: 0.0)
+    return fake
+
+@pytest.fixture
+def fake_voice():
+    # NOTE synthesize only reads the tts voice, so skip looking one up
+    return SimpleNamespace(_tts_voice=tts.Voice(name="en-US-Standard-A", language_codes=["en-US"]))
+
+def test_synthesize_many_retries_in_order(fake_api, fake_voice, monkeypatch):
+    acquired = []
+    acquire = synthesize._TokenBucket.acquire
+    monkeypatch.setattr(synthesize._TokenBucket, "acquire", lambda self: (acquired.append(self.qps), acquire(self)))
+    fake_api.failures["Goodbye."] = 1
+    texts = ["Hello.", "Goodbye.", "See you.", "Hello."]
+    wavs = synthesize.synthesize_many(texts, fake_voice, to="bytes", max_concurrency=4, qps=1000)
+    assert wavs == [_wav(text) for text in texts]
+    assert sorted(fake_api.texts) == ["Goodbye.", "Goodbye.", "Hello.", "See you."]
+    assert fake_api.sleeps == [1.0]  # NOTE 2 ** 0 * (1 + random()) before the only retry
+    assert acquired == [1000] * 4  # NOTE one token per API call, retries included; the repeated text takes none
+
+def test_synthesize_many_gives_up(fake_api, fake_voice):
+    fake_api.failures["Hello."] = 10
+    with pytest.raises(ResourceExhausted):
+        synthesize.synthesize_many(["Hello."], fake_voice, to="bytes", qps=None, retries=2)
+    assert fake_api.texts == ["Hello."] * 3
+    assert fake_api.sleeps == [1.0, 2.0]
+
+def test_synthesize_as_completed_yields_indices(fake_api, fake_voice):
+    fake_api.before["Hello."] = lambda: _wait_for(lambda: "Goodbye." in fake_api.texts)
+    results = list(synthesize.synthesize_as_completed(["Hello.", "Goodbye."], fake_voice, to="bytes", max_concurrency=2, qps=None))
+    assert results == [(1, _wav("Goodbye.")), (0, _wav("Hello."))]
+
+def test_synthesize_cache(fake_api, fake_voice, tmp_path, monkeypatch):
+    monkeypatch.setattr(synthesize, "cache", BytesCache(directory=tmp_path))
+    assert synthesize.synthesize("Hello.", fake_voice, to="bytes") == _wav("Hello.")
+    assert synthesize.synthesize("Hello.", fake_voice, to="bytes") == _wav("Hello.")
+    assert synthesize.synthesize("Hello.", fake_voice, to="bytes", use_cache=False) == _wav("Hello.")
+    assert fake_api.texts == ["Hello."] * 2
+    assert (synthesize.cache.memory_hits, synthesize.cache.misses) == (1, 1)
+    monkeypatch.setattr(synthesize, "cache", BytesCache(directory=tmp_path))  # NOTE e.g. after a restart
+    clip = synthesize.synthesize("Hello.", fake_voice, to="clip")
+    assert clip.samples == 240 * len("Hello.") and synthesize.cache.disk_hits == 1
+    assert len(fake_api.texts) == 2
+
+def test_synthesize_shares_concurrent_calls(fake_api, fake_voice):
+    # NOTE hold the call until the other callers have joined it
+    fake_api.before["Hello."] = lambda: _wait_for(lambda: synthesize.inflight.shared == 7)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        wavs = list(pool.map(lambda _: synthesize.synthesize("Hello.", fake_voice, to="bytes"), range(8)))
+    assert wavs == [_wav("Hello.")] * 8
+    assert fake_api.texts == ["Hello."]
+    assert (synthesize.inflight.calls, synthesize.inflight.shared) == (1, 7)
+    assert synthesize.cache.stats["misses"] == 1  # NOTE callers that joined aren't counted as misses
+
+def test_synthesize_async_shares_concurrent_calls(fake_api, fake_voice):
+    async def held():
+        await asyncio.sleep(0.01)
+    fake_api.async_client.before["Hello."] = held
+    async def many():
+        return await asyncio.gather(*(synthesize.synthesize_async("Hello.", fake_voice, to="bytes") for _ in range(4)))
+    assert asyncio.run(many()) == [_wav("Hello.")] * 4
+    assert fake_api.texts == ["Hello."]
+    assert synthesize.inflight.shared == 3
+
+def test_synthesize_stream_in_order(fake_api, fake_voice):
+    # NOTE the first sentence is answered last, but is still yielded first
+    fake_api.before["Hello there!"] = lambda: _wait_for(lambda: "How are you?" in fake_api.texts)
+    frames = list(synthesize.synthesize_stream("Hello there! How are you? Fine.", fake_voice, max_concurrency=2))
+    assert [af.samples for af in frames] == [240 * len(s) for s in ("Hello there!", "How are you?", "Fine.")]
+    assert fake_api.texts[:2] == ["How are you?", "Hello there!"]
+
+def test_synthesize_stream_async_in_order(fake_api, fake_voice):
+    async def last():
+        while len(fake_api.texts) < 2:
+            await asyncio.sleep(0.005)
+    fake_api.async_client.before["Hello there!"] = last
+    async def collect():
+        return [wav async for wav in synthesize.synthesize_stream_async("Hello there! How are you? Fine.", fake_voice, to="bytes", max_concurrency=3)]
+    assert asyncio.run(collect()) == [_wav(s) for s in ("Hello there!", "How are you?", "Fine.")]
+    assert fake_api.texts[-1] == "Hello there!"
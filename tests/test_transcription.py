@@ -1,10 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
 from pathlib import Path
+import threading
+import time
+from types import SimpleNamespace
 
 from google.cloud.storage import Client
+import av
+import numpy as np
 import pytest
 
 from moshi import setup_loguru
-from moshiaud import storage, transcribe
+from moshiaud import audio, storage, transcribe, wavfile
+from moshiaud.cache import SingleFlight
+from moshiaud.exceptions import TranscriptionError
 
 # NOTE must setup logging for TRANSCRIPT to be logged and not error
 setup_loguru()
@@ -38,4 +47,58 @@ def test_transcribe_gs_bytes(usr_audio: Path, store: Client):
         audio_bytes = f.read()
     transcription = transcribe.transcribe(audio_bytes, "en-US")
     print(f"transcription={transcription}")
-    assert transcription == "hello"
\ No newline at end of file
+    assert transcription == "hello"
+
+def test_transcribe_vad_skips_silent_audio():
+    """Silent audio fails fast with vad=True, without calling Speech-to-Text."""
+    wav = io.BytesIO()
+    wavfile.write(wav, 16000, np.zeros(16000, dtype=np.int16))
+    with pytest.raises(TranscriptionError):
+        transcribe.transcribe(wav.getvalue(), "en-US", vad=True)
+
+def test_transcribe_vad_skips_silent_audio_frame():
+    af = av.AudioFrame.from_ndarray(np.zeros((1, 16000), dtype=np.int16), format="s16", layout="mono")
+    af.rate = 16000
+    with pytest.raises(TranscriptionError):
+        transcribe.transcribe(af, "en-US", vad=True)
+
+@pytest.mark.parametrize("aud", [b"RIFF", b"fLaC\x00\x00\x00\x22", b""])
+def test_transcription_key_falls_back_to_bytes_hash(aud: bytes):
+    key = transcribe._transcription_key(aud, "en-US", False)
+    assert key == transcribe._transcription_key(aud, "en-US", False)
+    assert key != transcribe._transcription_key(aud + b"\x00", "en-US", False)
+
+@pytest.mark.parametrize("aud", [b"RIFF", b"fLaC\x00\x00\x00\x22", b""])
+def test_vad_passes_through_unreadable_wav(aud: bytes):
+    assert transcribe._vad(aud) == aud
+
+def test_frames_and_vad_wavs_are_sent_as_mono_flac(wavbytes, monkeypatch):
+    def no_resampler(*args, **kwargs):
+        raise AssertionError("mono and stereo audio shouldn't need an av.AudioResampler")
+    monkeypatch.setattr(av, "AudioResampler", no_resampler)
+    af = audio.wav2af(wavbytes)
+    assert af.layout.name == "stereo"
+    for content in (transcribe._af2content(af), transcribe._vad(wavbytes)):
+        assert content[:4] == b"fLaC"
+        rate, arr = audio.decode_ndarray(content)
+        assert rate == af.rate and arr.shape[1] == 1
+
+def test_transcribe_shares_concurrent_calls(wavbytes, monkeypatch):
+    monkeypatch.setattr(transcribe, "inflight", SingleFlight())
+    requests = []
+    def recognize(config, audio):
+        requests.append(config.language_code)
+        # NOTE hold the call until the other callers have joined it
+        deadline = time.monotonic() + 2
+        while transcribe.inflight.shared < 3 and time.monotonic() < deadline:
+            threading.Event().wait(0.005)
+        alternative = SimpleNamespace(transcript="hello", confidence=0.9)
+        return SimpleNamespace(results=[SimpleNamespace(alternatives=[alternative])])
+    monkeypatch.setattr(transcribe, "client", SimpleNamespace(recognize=recognize))
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        texts = list(pool.map(lambda _: transcribe.transcribe(wavbytes, "en-US"), range(4)))
+    assert texts == ["hello"] * 4
+    assert requests == ["en-US"]
+    assert (transcribe.inflight.calls, transcribe.inflight.shared) == (1, 3)
+    assert transcribe.transcribe(wavbytes, "en-GB") == "hello"  # NOTE a different language is a different call
+    assert requests == ["en-US", "en-GB"]
@@ -0,0 +1,265 @@
+import io
+from pathlib import Path
+
+import av
+import numpy as np
+import pytest
+
+from moshiaud import wavfile
+
+WAV_FILES = ["hello.wav", "hello_mono.wav"]
+
+@pytest.fixture(params=WAV_FILES)
+def wav_path(request, data_dir: Path) -> Path:
+    return data_dir / request.param
+
+@pytest.mark.parametrize("as_source", [str, lambda p: p.read_bytes(), lambda p: memoryview(p.read_bytes()), lambda p: io.BytesIO(p.read_bytes())])
+def test_iter_blocks_matches_read(wav_path: Path, as_source):
+    rate, expected = wavfile.read(wav_path)
+    rate_, blocks = wavfile.iter_blocks(as_source(wav_path), block_frames=1000)
+    blocks = list(blocks)
+    assert rate_ == rate
+    assert all(len(b) == 1000 for b in blocks[:-1])
+    assert 0 < len(blocks[-1]) <= 1000
+    np.testing.assert_array_equal(np.concatenate(blocks), expected)
+
+def test_iter_blocks_rejects_empty_blocks(wav_path: Path):
+    with pytest.raises(ValueError):
+        wavfile.iter_blocks(wav_path, block_frames=0)
+
+def test_wav_writer_matches_write(wav_path: Path):
+    rate, data = wavfile.read(wav_path)
+    expected = io.BytesIO()
+    wavfile.write(expected, rate, data)
+    wav = io.BytesIO()
+    with wavfile.WavWriter(wav, rate) as writer:
+        for i in range(0, len(data), 1000):
+            writer.append(data[i:i+1000])
+    assert wav.getvalue() == expected.getvalue()
+    rate_, data_ = wavfile.read(wav)
+    assert rate_ == rate
+    np.testing.assert_array_equal(data_, data)
+
+def test_wav_writer_appends_audio_frames():
+    arr = np.arange(200, dtype=np.int16).reshape(-1, 2)
+    af = av.AudioFrame.from_ndarray(arr.reshape(1, -1), format="s16", layout="stereo")
+    wav = io.BytesIO()
+    with wavfile.WavWriter(wav, 24000) as writer:
+        writer.append(af)
+        writer.append(af)
+    rate, data = wavfile.read(wav)
+    assert rate == 24000
+    np.testing.assert_array_equal(data, np.concatenate([arr, arr]))
+
+def test_wav_writer_rejects_mismatched_blocks():
+    with wavfile.WavWriter(io.BytesIO(), 24000) as writer:
+        writer.append(np.zeros((10, 2), dtype=np.int16))
+        with pytest.raises(ValueError):
+            writer.append(np.zeros((10, 1), dtype=np.int16))
+        with pytest.raises(ValueError):
+            writer.append(np.zeros((10, 2), dtype=np.float32))
+
+def test_info_matches_read(wav_path: Path):
+    rate, data = wavfile.read(wav_path)
+    for src in (wav_path, wav_path.read_bytes()):
+        info = wavfile.info(src)
+        assert info.format_tag == wavfile.WAVE_FORMAT.PCM
+        assert info.rate == rate
+        assert info.channels == (1 if data.ndim == 1 else data.shape[1])
+        assert info.bit_depth == 16
+        assert info.frames == len(data)
+        assert info.seconds == len(data) / rate
+        raw = wav_path.read_bytes()
+        assert raw[info.data_offset - 8:info.data_offset - 4] == b'data'
+
+def test_info_truncated(wav_path: Path):
+    raw = wav_path.read_bytes()
+    full = wavfile.info(raw)
+    info = wavfile.info(raw[:-1000])
+    assert info.frames == (full.data_size - 1000) // full.block_align
+
+def test_info_rejects_non_wav(data_dir: Path):
+    with pytest.raises(ValueError):
+        wavfile.info(data_dir / "hello.m4a")
+
+@pytest.mark.parametrize("as_buffer", [bytes, bytearray, memoryview])
+def test_read_buffer_is_zero_copy(wav_path: Path, as_buffer):
+    buf = as_buffer(wav_path.read_bytes())
+    rate, data = wavfile.read(buf)
+    rate_, expected = wavfile.read(wav_path)
+    assert rate == rate_
+    np.testing.assert_array_equal(data, expected)
+    assert np.shares_memory(data, np.frombuffer(buf, dtype=np.uint8))
+
+@pytest.mark.parametrize("start,stop", [(0, 100), (1000, 2500), (-441, None), (-100, -50), (5, 5), (40000, 10**9)])
+@pytest.mark.parametrize("mmap", [False, True])
+def test_read_range_matches_read(wav_path: Path, start, stop, mmap):
+    rate, data = wavfile.read(wav_path)
+    rate_, part = wavfile.read_range(wav_path, start, stop, mmap=mmap)
+    assert rate_ == rate
+    np.testing.assert_array_equal(part, data[start:stop])
+
+def test_read_range_from_bytes(wav_path: Path):
+    raw = wav_path.read_bytes()
+    rate, data = wavfile.read(raw)
+    _, tail = wavfile.read_range(raw, -rate)
+    np.testing.assert_array_equal(tail, data[-rate:])
+
+@pytest.mark.parametrize("channels", [1, 2])
+def test_24bit_round_trip(channels):
+    rng = np.random.default_rng(0)
+    data = rng.integers(-2**23, 2**23, size=(1001, channels), dtype=np.int32) << 8
+    if channels == 1:
+        data = data.ravel()
+    wav = io.BytesIO()
+    wavfile.write(wav, 48000, data, bit_depth=24)
+    info = wavfile.info(wav)
+    assert (info.bit_depth, info.block_align) == (24, 3 * channels)
+    assert info.data_size == data.size * 3
+    rate, data_ = wavfile.read(wav)
+    assert data_.dtype == np.int32
+    np.testing.assert_array_equal(data_, data)
+    _, blocks = wavfile.iter_blocks(wav.getvalue(), block_frames=100)
+    np.testing.assert_array_equal(np.concatenate(list(blocks)), data)
+    streamed = io.BytesIO()
+    with wavfile.WavWriter(streamed, 48000, bit_depth=24) as writer:
+        writer.append(data[:500])
+        writer.append(data[500:])
+    assert streamed.getvalue() == wav.getvalue()
+
+def test_24bit_big_endian():
+    # RIFX, 24-bit mono: two samples, 0x123456 and -1
+    fmt = b'fmt ' + (16).to_bytes(4, 'big') + bytes.fromhex('0001 0001 00001f40 00005dc0 0003 0018')
+    data = b'data' + (6).to_bytes(4, 'big') + bytes.fromhex('123456 ffffff')
+    body = b'WAVE' + fmt + data
+    wav = b'RIFX' + len(body).to_bytes(4, 'big') + body
+    rate, arr = wavfile.read(wav)
+    assert rate == 8000
+    assert arr.astype(np.int64).tolist() == [0x12345600, -256]
+
+def test_write_rejects_bad_bit_depth():
+    with pytest.raises(ValueError):
+        wavfile.write(io.BytesIO(), 8000, np.zeros(10, dtype=np.int16), bit_depth=24)
+
+def test_rf64_round_trip(wav_path: Path, tmp_path: Path):
+    rate, data = wavfile.read(wav_path)
+    out = tmp_path / "rf64.wav"
+    wavfile.write(out, rate, data, rf64=True)
+    raw = out.read_bytes()
+    assert raw[:4] == b'RF64' and raw[12:16] == b'ds64'
+    for mmap in (False, True):
+        rate_, data_ = wavfile.read(out, mmap=mmap)
+        assert rate_ == rate
+        np.testing.assert_array_equal(data_, data)
+    assert wavfile.info(raw).frames == len(data)
+    np.testing.assert_array_equal(wavfile.read_range(out, -100, mmap=True)[1], data[-100:])
+
+@pytest.mark.parametrize("rf64", [True, "auto"])
+def test_wav_writer_rf64(wav_path: Path, rf64):
+    rate, data = wavfile.read(wav_path)
+    wav = io.BytesIO()
+    with wavfile.WavWriter(wav, rate, rf64=rf64) as writer:
+        writer.append(data[:1000])
+        writer.append(data[1000:])
+    raw = wav.getvalue()
+    assert raw[:4] == (b'RF64' if rf64 is True else b'RIFF')
+    assert raw[12:16] == (b'ds64' if rf64 is True else b'JUNK')
+    rate_, data_ = wavfile.read(raw)
+    np.testing.assert_array_equal(data_, data)
+
+@pytest.mark.parametrize("max_workers", [None, 4])
+def test_read_many(data_dir: Path, max_workers):
+    path = data_dir / "hello_mono.wav"
+    rate, full = wavfile.read(path)
+    raw = path.read_bytes()
+    short = io.BytesIO()
+    wavfile.write(short, rate, full[:1000])
+    rate_, data, lengths = wavfile.read_many([path, raw, short.getvalue()], max_workers=max_workers)
+    assert rate_ == rate
+    assert data.shape == (3, len(full), 1) and data.dtype == np.int16
+    assert lengths.tolist() == [len(full), len(full), 1000]
+    np.testing.assert_array_equal(data[0, :, 0], full)
+    np.testing.assert_array_equal(data[2, :1000, 0], full[:1000])
+    assert not data[2, 1000:].any()
+    _, data, lengths = wavfile.read_many([path, short.getvalue()], pad_to=500)
+    assert data.shape == (2, 500, 1) and lengths.tolist() == [500, 500]
+
+def test_read_many_rejects_mixed_channels(data_dir: Path):
+    with pytest.raises(ValueError):
+        wavfile.read_many([data_dir / "hello.wav", data_dir / "hello_mono.wav"])
+
+@pytest.mark.parametrize("format_tag", [wavfile.WAVE_FORMAT.MULAW, wavfile.WAVE_FORMAT.ALAW])
+def test_g711_round_trip(wav_path: Path, format_tag):
+    rate, data = wavfile.read(wav_path)
+    wav = io.BytesIO()
+    wavfile.write(wav, rate, data, format_tag=format_tag)
+    info = wavfile.info(wav)
+    assert (info.format_tag, info.bit_depth, info.frames) == (format_tag, 8, len(data))
+    rate_, decoded = wavfile.read(wav)
+    assert rate_ == rate and decoded.dtype == np.int16 and decoded.shape == data.shape
+    # G.711 keeps ~13 bits of precision: error is within one quantization step
+    err = np.abs(decoded.astype(np.int32) - data)
+    assert np.all(err <= np.abs(data.astype(np.int32)) // 16 + 16)
+    # encoding the decoded samples again is lossless
+    wav2 = io.BytesIO()
+    with wavfile.WavWriter(wav2, rate, format_tag=format_tag) as writer:
+        writer.append(decoded)
+    np.testing.assert_array_equal(wavfile.read(wav2)[1], decoded)
+    np.testing.assert_array_equal(wavfile.read_range(wav.getvalue(), 100, 200)[1], decoded[100:200])
+
+def test_g711_decode_table():
+    mulaw = wavfile._G711_DECODE[wavfile.WAVE_FORMAT.MULAW]
+    alaw = wavfile._G711_DECODE[wavfile.WAVE_FORMAT.ALAW]
+    assert (mulaw[0x00], mulaw[0x80], mulaw[0xFF], mulaw[0x7F]) == (-32124, 32124, 0, 0)
+    assert (alaw[0x55], alaw[0xD5], alaw[0x2A], alaw[0xAA]) == (-8, 8, -32256, 32256)
+
+@pytest.fixture
+def opened(monkeypatch) -> list:
+    """Track the files wavfile opens from paths."""
+    files = []
+    def tracking_open(*args, **kwargs):
+        files.append(open(*args, **kwargs))
+        return files[-1]
+    monkeypatch.setattr(wavfile, "open", tracking_open, raising=False)
+    return files
+
+def test_iter_blocks_opens_path_lazily(wav_path: Path, opened: list):
+    rate, blocks = wavfile.iter_blocks(wav_path)
+    assert all(f.closed for f in opened)
+    n = len(opened)
+    next(blocks)
+    assert len(opened) == n + 1 and not opened[-1].closed
+    blocks.close()
+    assert all(f.closed for f in opened)
+
+def test_iter_blocks_closes_path_on_unsupported_format(tmp_path: Path, opened: list):
+    # IEEE float with 24-bit samples has a valid header but no dtype
+    fmt = b'fmt ' + (16).to_bytes(4, 'little') + bytes.fromhex('0300 0100 401f0000 c05d0000 0300 1800')
+    body = b'WAVE' + fmt + b'data' + (6).to_bytes(4, 'little') + bytes(6)
+    path = tmp_path / "float24.wav"
+    path.write_bytes(b'RIFF' + len(body).to_bytes(4, 'little') + body)
+    with pytest.raises(ValueError):
+        wavfile.iter_blocks(path)
+    assert opened and all(f.closed for f in opened)
+
+def test_iter_blocks_rewinds_file_handles(wav_path: Path):
+    with open(wav_path, 'rb') as f:
+        rate, blocks = wavfile.iter_blocks(f)
+        assert f.tell() == 0
+        rate_, expected = wavfile.read(wav_path)
+        np.testing.assert_array_equal(np.concatenate(list(blocks)), expected)
+        assert f.tell() == 0
+
+@pytest.mark.filterwarnings("ignore::moshiaud.wavfile.WavFileWarning")
+@pytest.mark.parametrize("truncate", [0, 1000, 1001])
+def test_24bit_read_from_path_in_blocks(tmp_path: Path, monkeypatch, truncate):
+    monkeypatch.setattr(wavfile, "_ODD_WIDTH_BLOCK", 100)
+    rng = np.random.default_rng(0)
+    data = rng.integers(-2**23, 2**23, size=(1001, 2), dtype=np.int32) << 8
+    path = tmp_path / "int24.wav"
+    wavfile.write(path, 48000, data, bit_depth=24)
+    raw = path.read_bytes()
+    path.write_bytes(raw[:len(raw) - truncate])
+    rate, data_ = wavfile.read(path)
+    np.testing.assert_array_equal(data_, data[:len(data_)])
+    assert len(data_) == (1001 * 6 - truncate) // 6